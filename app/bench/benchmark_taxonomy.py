@@ -0,0 +1,103 @@
+"""Candidate selection latency and recall on large synthetic taxonomies
+
+Builds taxonomies of increasing size (each node's embedding is its parent's
+plus noise, so branches are semantically coherent), then times single-text
+candidate selection with the flat CategoryMatcher and the hierarchical
+TaxonomyIndex, and reports the recall of the flat top k within the index's
+top k. Query texts are noisy copies of random categories.
+
+Usage (from the app directory):
+    python -m bench.benchmark_taxonomy --branching 20,20,25 --beam-widths 5,10,20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.category_matcher import CategoryMatcher  # noqa: E402
+from src.taxonomy_index import TaxonomyIndex  # noqa: E402
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--branching", default="10,10,10;20,20,25;30,30,50",
+                        help="Semicolon-separated taxonomies, each a comma-separated branching factor per level")
+    parser.add_argument("--beam-widths", default="5,10,20", help="Comma-separated beam widths")
+    parser.add_argument("--k", type=int, default=55, help="Candidate categories per text")
+    parser.add_argument("--queries", type=int, default=200, help="Timed single-text queries")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--noise", type=float, default=0.6, help="Per-level noise added to child embeddings")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    return parser.parse_args(argv)
+
+
+def synthesize_taxonomy(branching: List[int], dim: int, noise: float, rng) -> Tuple[List[str], np.ndarray]:
+    """Leaf category paths and embeddings of a tree with the given branching per level"""
+    level = [("", rng.standard_normal(dim))]
+    for depth, width in enumerate(branching, start=1):
+        level = [
+            (f"{path}/L{depth}-{i}", vector + noise * rng.standard_normal(dim))
+            for path, vector in level
+            for i in range(width)
+        ]
+    paths = [path for path, _ in level]
+    vectors = np.array([vector for _, vector in level], dtype=np.float32)
+    return paths, vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def time_queries(matcher, queries: np.ndarray, k: int) -> Tuple[float, List[List[str]]]:
+    """Median milliseconds per single-text top-k call, and the candidate lists"""
+    results, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(matcher.get_top_k_categories(query, k=k))
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000), results
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    rng = np.random.default_rng(args.seed)
+    beam_widths = [int(b) for b in args.beam_widths.split(",") if b.strip()]
+
+    report: Dict[str, Dict] = {}
+    for spec in args.branching.split(";"):
+        branching = [int(b) for b in spec.split(",") if b.strip()]
+        categories, embeddings = synthesize_taxonomy(branching, args.dim, args.noise, rng)
+        counts = Counter({cat: int(n) for cat, n in zip(categories, rng.integers(0, 40, len(categories)))})
+        picks = rng.integers(0, len(categories), args.queries)
+        queries = embeddings[picks] + 0.05 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+        flat = CategoryMatcher(categories, embeddings)
+        flat.create_frequency_buckets(counts)
+        flat_ms, reference = time_queries(flat, queries, args.k)
+        entry = {"categories": len(categories), "flat_ms": flat_ms, "index": {}}
+
+        for beam_width in beam_widths:
+            index = TaxonomyIndex(categories, embeddings, beam_width=beam_width)
+            index.create_frequency_buckets(counts)
+            index_ms, candidates = time_queries(index, queries, args.k)
+            recall = np.mean([len(set(r) & set(c)) / len(r) for r, c in zip(reference, candidates)])
+            entry["index"][beam_width] = {"ms": index_ms, "recall": float(recall)}
+        report["x".join(map(str, branching))] = entry
+
+    print(f"\nk={args.k}, {args.queries} queries, median latency per text\n")
+    for name, entry in report.items():
+        print(f"  {name:<12} {entry['categories']:>7} categories  flat {entry['flat_ms']:7.3f} ms")
+        for beam_width, stats in entry["index"].items():
+            print(f"  {'':<12} {'':>7}             beam {beam_width:<3} {stats['ms']:7.3f} ms  recall {stats['recall']:.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"taxonomies": report, "config": vars(args)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Embedding backend comparison
+
+Encodes the same texts and training categories with the float32 PyTorch
+reference model and with each other backend, and reports model load time,
+encode throughput, the cosine similarity of each text embedding to the
+reference one, and how well the top-k candidate categories match the
+reference candidates (overlap of the top-k lists, and recall of the
+reference's top 10 within the backend's top-k).
+
+Usage (from the app directory):
+    python -m bench.compare_backends --data with_label.csv --backends onnx,onnx-int8,torch-int8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.run_benchmark import synthesize_training_data  # noqa: E402
+from src.category_matcher import CategoryMatcher  # noqa: E402
+from src.embeddings import BACKENDS, EmbeddingGenerator  # noqa: E402
+from src.ingest import read_training_data, truncate_words  # noqa: E402
+from src.pipeline import ClassificationPipeline  # noqa: E402
+
+REFERENCE = "torch"
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", default="../sample.csv", help="CSV with a text column to encode")
+    parser.add_argument("--data", help="Labeled training CSV providing the categories; synthesized when omitted")
+    parser.add_argument("--backends", default="torch-int8,onnx,onnx-int8",
+                        help=f"Comma-separated backends compared with {REFERENCE} ({', '.join(BACKENDS)})")
+    parser.add_argument("--texts", type=int, default=512, help="Texts encoded per backend")
+    parser.add_argument("--k", type=int, default=55, help="Candidate categories per text")
+    parser.add_argument("--threads", type=int, help="Encode threads per backend (default: library default)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per forward pass")
+    parser.add_argument("--onnx-file", help="ONNX file in the model repository for the onnx backends")
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    return parser.parse_args(argv)
+
+
+def load_texts(path: str, n: int) -> List[str]:
+    """n truncated texts, repeating the input rows with a variant suffix when there are fewer"""
+    texts = truncate_words(pd.read_csv(path)['text'], ClassificationPipeline.max_words).tolist()
+    return [texts[i % len(texts)] if i < len(texts) else f"{texts[i % len(texts)]} variant {i}" for i in range(n)]
+
+
+def top_k_agreement(reference: List[List[str]], candidates: List[List[str]], recall_at: int = 10) -> Dict[str, float]:
+    """Mean top-k overlap with the reference, and recall of the reference's first recall_at candidates"""
+    overlap = [len(set(r) & set(c)) / len(r) for r, c in zip(reference, candidates) if r]
+    recall = [len(set(r[:recall_at]) & set(c)) / len(r[:recall_at]) for r, c in zip(reference, candidates) if r]
+    return {
+        "top_k_overlap": float(np.mean(overlap)) if overlap else 0.0,
+        f"reference_top{recall_at}_recall": float(np.mean(recall)) if recall else 0.0,
+    }
+
+
+def run_backend(backend: str, texts: List[str], categories: List[str], label_counts: Counter, args) -> Dict:
+    """Load a backend, time its encoding and return its embeddings and top-k candidates"""
+    start = time.perf_counter()
+    generator = EmbeddingGenerator(
+        backend=backend,
+        batch_size=args.batch_size,
+        num_threads=args.threads,
+        onnx_file=args.onnx_file
+    )
+    load_seconds = time.perf_counter() - start
+
+    # Warm up before timing
+    generator.encode(texts[:min(len(texts), args.batch_size)])
+    start = time.perf_counter()
+    embeddings = np.asarray(generator.encode(texts), dtype=np.float32)
+    encode_seconds = time.perf_counter() - start
+
+    matcher = CategoryMatcher(categories, generator.encode(categories))
+    matcher.create_frequency_buckets(label_counts)
+    return {
+        "embeddings": embeddings,
+        "candidates": matcher.get_top_k_categories_batch(embeddings, k=args.k),
+        "load_seconds": load_seconds,
+        "texts_per_sec": len(texts) / encode_seconds if encode_seconds else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    backends = [b.strip() for b in args.backends.split(",") if b.strip() and b.strip() != REFERENCE]
+    texts = load_texts(args.inputs, args.texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = args.data
+        if data_path is None:
+            data_path = os.path.join(tmp, "with_label.csv")
+            synthesize_training_data(pd.read_csv(args.inputs), 2000, data_path)
+        df = read_training_data(data_path, max_words=ClassificationPipeline.max_words)
+    categories = sorted(df['categories'].explode().dropna().unique())
+    label_counts = Counter(df['categories'].explode())
+    if args.k >= len(categories):
+        print(f"Note: k={args.k} covers all {len(categories)} categories, so candidate overlap is trivially 1")
+
+    reference = run_backend(REFERENCE, texts, categories, label_counts, args)
+    report = {
+        REFERENCE: {
+            "load_seconds": reference["load_seconds"],
+            "texts_per_sec": reference["texts_per_sec"],
+            "speedup": 1.0,
+        }
+    }
+    for backend in backends:
+        result = run_backend(backend, texts, categories, label_counts, args)
+        # Embeddings are normalized, so the row-wise dot product is the cosine similarity
+        cosine = np.sum(result["embeddings"] * reference["embeddings"], axis=1)
+        report[backend] = {
+            "load_seconds": result["load_seconds"],
+            "texts_per_sec": result["texts_per_sec"],
+            "speedup": result["texts_per_sec"] / reference["texts_per_sec"] if reference["texts_per_sec"] else 0.0,
+            "cosine_to_reference_mean": float(cosine.mean()),
+            "cosine_to_reference_min": float(cosine.min()),
+            **top_k_agreement(reference["candidates"], result["candidates"]),
+        }
+
+    print(f"\n{len(texts)} texts, {len(categories)} categories, k={args.k}\n")
+    for backend, stats in report.items():
+        line = (
+            f"  {backend:<11} load {stats['load_seconds']:6.2f} s  "
+            f"{stats['texts_per_sec']:8.1f} texts/s  x{stats['speedup']:.2f}"
+        )
+        if backend != REFERENCE:
+            line += (
+                f"  cosine {stats['cosine_to_reference_mean']:.4f} (min {stats['cosine_to_reference_min']:.4f})"
+                f"  top-k overlap {stats['top_k_overlap']:.3f}"
+                f"  top-10 recall {stats['reference_top10_recall']:.3f}"
+            )
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"backends": report, "config": vars(args)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Offline evaluation of candidate list settings
+
+Holds out part of a labeled CSV, prepares the pipeline on the rest, and for
+each fixed k and each adaptive pruning setting reports how many candidates
+are sent per page, label recall (the share of held-out labels that appear
+among the candidates, counting only labels known from the training part),
+the share of pages with all labels recalled, and the estimated prompt size.
+No Watsonx calls are made.
+
+Usage (from the app directory):
+    python -m bench.evaluate_candidates --data with_label.csv --k 10,20,35,55 \\
+        --adaptive score_gap=0.15 --adaptive cumulative_mass=0.9,min_candidates=5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fakes import FakeModelInference, HashingEmbeddingGenerator  # noqa: E402
+from src.category_matcher import CandidatePruning  # noqa: E402
+from src.classifier import TextClassifier  # noqa: E402
+from src.example_selector import estimate_tokens  # noqa: E402
+from src.ingest import read_training_data  # noqa: E402
+from src.pipeline import ClassificationPipeline  # noqa: E402
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="Labeled CSV (url, text, label)")
+    parser.add_argument("--k", default="10,20,35,55", help="Comma-separated fixed k values")
+    parser.add_argument("--adaptive", action="append", default=[], metavar="RULE=VALUE,...",
+                        help="CandidatePruning settings evaluated with --max-k as the upper bound, repeatable")
+    parser.add_argument("--max-k", type=int, default=55, help="Upper bound for adaptive settings")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of rows held out for evaluation")
+    parser.add_argument("--max-eval-rows", type=int, default=2000, help="Cap on held-out rows")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the split")
+    parser.add_argument("--real-embeddings", action="store_true",
+                        help="Use the SentenceTransformer model instead of hashing embeddings")
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    return parser.parse_args(argv)
+
+
+def parse_pruning(spec: str) -> CandidatePruning:
+    """Build a CandidatePruning from 'rule=value,rule=value'"""
+    options = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        options[name.strip()] = json.loads(value)
+    return CandidatePruning(**options)
+
+
+def evaluate(
+    candidates: List[List[str]],
+    labels: List[List[str]],
+    prompt_tokens: List[int],
+    known: set
+) -> Dict[str, float]:
+    """Candidate count, label recall and prompt size for one setting"""
+    sizes = [len(c) for c in candidates]
+    hits = total = complete = 0
+    for row_candidates, row_labels in zip(candidates, labels):
+        expected = [label for label in row_labels if label in known]
+        row_candidates = set(row_candidates)
+        found = sum(label in row_candidates for label in expected)
+        hits += found
+        total += len(expected)
+        complete += found == len(expected)
+    return {
+        "mean_candidates": float(np.mean(sizes)),
+        "p95_candidates": float(np.percentile(sizes, 95)),
+        "label_recall": hits / total if total else 0.0,
+        "all_labels_recalled": complete / len(labels) if labels else 0.0,
+        "mean_prompt_tokens": float(np.mean(prompt_tokens)),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    raw = pd.read_csv(args.data).sample(frac=1.0, random_state=args.seed).reset_index(drop=True)
+    n_eval = min(max(1, int(len(raw) * args.holdout)), args.max_eval_rows)
+    train_raw, eval_raw = raw.iloc[n_eval:], raw.iloc[:n_eval]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        train_path = os.path.join(tmp, "train.csv")
+        train_raw.to_csv(train_path, index=False)
+        pipeline = ClassificationPipeline(
+            watsonx_api_key="",
+            watsonx_project_id="",
+            data_path=train_path,
+            embedding_generator=None if args.real_embeddings else HashingEmbeddingGenerator(),
+            classifier=TextClassifier(api_key="", project_id="", model=FakeModelInference()),
+            embed_batch_max_size=1
+        )
+        pipeline.load_and_prepare_data().generate_embeddings().create_frequency_buckets().prepare_examples()
+
+    held_out = read_training_data(eval_raw, max_words=pipeline.max_words)
+    urls = held_out['url'].astype(str).tolist()
+    texts = held_out['text'].tolist()
+    labels = held_out['categories'].tolist()
+    embeddings = pipeline.embedding_generator.encode(texts)
+    known = set(pipeline.unique_categories)
+
+    settings = [(f"k={k}", int(k), None) for k in args.k.split(",") if k.strip()]
+    settings += [(f"adaptive {spec} (k<={args.max_k})", args.max_k, parse_pruning(spec)) for spec in args.adaptive]
+
+    report = {}
+    for name, k, pruning in settings:
+        candidates = pipeline.category_matcher.get_top_k_categories_batch(
+            embeddings, bucket_map=pipeline.bucket_map, k=k, pruning=pruning
+        )
+        prompt_tokens = [
+            estimate_tokens(pipeline.classifier.build_prompt(url, text, c, pipeline.examples_string))
+            for url, text, c in zip(urls, texts, candidates)
+        ]
+        report[name] = evaluate(candidates, labels, prompt_tokens, known)
+
+    print(f"\n{len(held_out)} held-out pages, {len(known)} categories\n")
+    print(f"  {'setting':<45} {'cands':>6} {'p95':>5} {'recall':>7} {'all':>6} {'tokens':>7}")
+    for name, stats in report.items():
+        print(
+            f"  {name:<45} {stats['mean_candidates']:6.1f} {stats['p95_candidates']:5.0f}"
+            f" {stats['label_recall']:7.3f} {stats['all_labels_recalled']:6.3f}"
+            f" {stats['mean_prompt_tokens']:7.0f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": report, "config": vars(args)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Local stand-ins for Watsonx and the embedding model, for offline benchmarks"""
+import ast
+import asyncio
+import hashlib
+import random
+import re
+import threading
+import time
+import numpy as np
+from typing import List, Optional
+
+# Candidate lists as rendered by TextClassifier.build_prompt and build_multi_prompt
+_CANDIDATES = re.compile(r"pick the closest option from the given categories:\s*(\[.*?\])\s*\n", re.S)
+_ITEM_CANDIDATES = re.compile(r"allowed categories:\s*(\[.*?\])\s*\n", re.S)
+
+
+class FakeModelInference:
+    """Drop-in for ModelInference that answers locally with simulated latency"""
+
+    def __init__(
+        self,
+        latency_ms: float = 500.0,
+        per_token_ms: float = 0.05,
+        error_rate: float = 0.0,
+        n_labels: int = 2,
+        seed: Optional[int] = 0
+    ):
+        """
+        Initialize the fake model
+
+        Args:
+            latency_ms: Fixed latency per call
+            per_token_ms: Extra latency per estimated prompt token
+            error_rate: Probability that a call raises an error
+            n_labels: Number of candidates returned per call
+            seed: Random seed for error injection
+        """
+        self.latency_ms = latency_ms
+        self.per_token_ms = per_token_ms
+        self.error_rate = error_rate
+        self.n_labels = n_labels
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _delay(self, prompt: str) -> float:
+        tokens = len(prompt.split()) * 4 / 3
+        return (self.latency_ms + self.per_token_ms * tokens) / 1000.0
+
+    def _answer(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+        if fail:
+            raise RuntimeError("Injected LLM error")
+
+        item_candidates = _ITEM_CANDIDATES.findall(prompt)
+        if item_candidates:
+            return "\n".join(
+                f"{number}: {ast.literal_eval(candidates)[:self.n_labels]}"
+                for number, candidates in enumerate(item_candidates, start=1)
+            )
+
+        match = _CANDIDATES.search(prompt)
+        candidates = ast.literal_eval(match.group(1)) if match else []
+        # Like the real model with stop_sequences=["]"], the closing bracket is cut off
+        return str(candidates[:self.n_labels])[:-1]
+
+    def generate_text(self, prompt: str, guardrails: bool = False, params=None, **kwargs) -> str:
+        time.sleep(self._delay(prompt))
+        return self._answer(prompt)
+
+    async def agenerate(self, prompt: str, guardrails: bool = False, params=None, **kwargs) -> dict:
+        await asyncio.sleep(self._delay(prompt))
+        return {"results": [{"generated_text": self._answer(prompt)}]}
+
+
+class HashingEmbeddingGenerator:
+    """Deterministic bag-of-words hashing embeddings with the EmbeddingGenerator interface"""
+
+    def __init__(self, dim: int = 384, model_name: str = "hashing-bow", batch_size: int = 64):
+        self.dim = dim
+        self.model_name = model_name
+        self.model_id = model_name
+        self.batch_size = batch_size
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in str(text).lower().split():
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self.dim] += 1.0
+        return vector
+
+    def encode(
+        self,
+        texts: List[str],
+        normalize: bool = True,
+        batch_size: Optional[int] = None
+    ) -> np.ndarray:
+        embeddings = np.stack([self._embed(t) for t in texts]) if len(texts) else np.zeros((0, self.dim), np.float32)
+        if normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            embeddings = embeddings / norms
+        return embeddings
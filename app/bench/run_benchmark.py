@@ -0,0 +1,263 @@
+"""Offline throughput and latency benchmark
+
+Runs ClassificationPipeline and the FastAPI app in-process against a local
+stand-in for Watsonx (simulated latency, token-proportional delay, error
+injection) and a local training file, so no Watsonx or COS credentials are
+needed. Reports startup phase times, per-stage timings, requests/sec and
+p50/p95/p99 latency for /classify and /classify/batch at each concurrency.
+
+Usage (from the app directory):
+    python -m bench.run_benchmark --inputs ../sample.csv --concurrency 1,8,32
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from bench.fakes import FakeModelInference, HashingEmbeddingGenerator  # noqa: E402
+from src.classifier import TextClassifier  # noqa: E402
+from src.llm_cache import LLMResultCache  # noqa: E402
+from src.metrics import STAGE_SECONDS  # noqa: E402
+from src.pipeline import ClassificationPipeline  # noqa: E402
+
+TAXONOMY = [
+    "/news/world/World News", "/news/politics/Elections", "/sports/team/Football",
+    "/sports/team/Basketball", "/health/conditions/Disability", "/health/fitness/Exercise",
+    "/business/finance/Investing", "/business/industry/Technology", "/arts/entertainment/Video Games",
+    "/arts/entertainment/Music", "/travel/destinations/Middle East", "/lifestyle/food/Cooking",
+]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", default="../sample.csv", help="CSV with url and text columns to classify")
+    parser.add_argument("--data", help="Labeled training CSV; synthesized from --inputs when omitted")
+    parser.add_argument("--training-rows", type=int, default=2000, help="Rows of synthesized training data")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="/classify requests per concurrency level")
+    parser.add_argument("--batch-rows", type=int, default=200, help="Rows per /classify/batch upload")
+    parser.add_argument("--batch-uploads", type=int, default=2, help="/classify/batch uploads per concurrency level")
+    parser.add_argument("--k", type=int, default=55, help="Candidate categories per text")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Fake LLM fixed latency per call")
+    parser.add_argument("--per-token-ms", type=float, default=0.05, help="Fake LLM latency per prompt token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake LLM error probability")
+    parser.add_argument("--real-embeddings", action="store_true",
+                        help="Use the SentenceTransformer model instead of hashing embeddings")
+    parser.add_argument("--llm-cache", action="store_true", help="Enable the in-memory LLM cache")
+    parser.add_argument("--pipeline-option", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra ClassificationPipeline keyword argument (JSON value), repeatable")
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    return parser.parse_args(argv)
+
+
+def synthesize_training_data(inputs: pd.DataFrame, n_rows: int, path: str):
+    """Write a labeled CSV by repeating input pages with deterministic pseudo-labels"""
+    rng = np.random.default_rng(0)
+    rows = []
+    for i in range(n_rows):
+        source = inputs.iloc[i % len(inputs)]
+        labels = [str(label) for label in rng.choice(TAXONOMY, size=rng.integers(1, 4), replace=False)]
+        rows.append({
+            "url": f"{source['url']}?v={i}",
+            "text": f"{source['text']} variant {i % 97}",
+            "label": str(labels),
+        })
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def latency_report(latencies: List[float], elapsed: float, errors: int, items: int) -> Dict[str, float]:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_per_sec": items / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def stage_delta(before: Dict, after: Dict) -> Dict[str, Dict[str, float]]:
+    """Mean stage timings between two STAGE_SECONDS summaries"""
+    report = {}
+    for key, (count, total) in sorted(after.items()):
+        prev_count, prev_total = before.get(key, (0, 0.0))
+        if count > prev_count:
+            report[key[0]] = {
+                "count": count - prev_count,
+                "mean_ms": (total - prev_total) / (count - prev_count) * 1000,
+            }
+    return report
+
+
+async def run_concurrent(n: int, concurrency: int, call) -> Tuple[List[float], int, float]:
+    """Issue n calls with at most concurrency in flight; return latencies, errors and wall time"""
+    latencies, errors = [], 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < n:
+            i = next_index
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def benchmark_app(app, inputs: pd.DataFrame, args, levels: List[int]) -> Dict:
+    records = inputs[["url", "text"]].astype(str).to_dict("records")
+    batch = pd.concat([inputs] * (args.batch_rows // len(inputs) + 1)).head(args.batch_rows)
+    batch_bytes = batch.to_csv(index=False).encode()
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for concurrency in levels:
+            async def classify(i):
+                record = records[i % len(records)]
+                # Vary the text so LLM cache hits do not dominate unless intended
+                payload = {"url": record["url"], "text": f"{record['text']} {i}", "k": args.k}
+                response = await client.post("/classify", json=payload)
+                return response.status_code == 200
+
+            before = STAGE_SECONDS.summary()
+            latencies, errors, elapsed = await run_concurrent(args.requests, concurrency, classify)
+            classify_report = latency_report(latencies, elapsed, errors, len(latencies))
+            classify_report["stages"] = stage_delta(before, STAGE_SECONDS.summary())
+
+            async def classify_batch(i):
+                response = await client.post(
+                    "/classify/batch",
+                    params={"k": args.k},
+                    files={"file": ("bench.csv", batch_bytes, "text/csv")}
+                )
+                return response.status_code == 200
+
+            before = STAGE_SECONDS.summary()
+            uploads = max(args.batch_uploads, 1)
+            latencies, errors, elapsed = await run_concurrent(uploads, min(concurrency, uploads), classify_batch)
+            batch_report = latency_report(latencies, elapsed, errors, len(latencies) * len(batch))
+            batch_report["rows_per_upload"] = len(batch)
+            batch_report["stages"] = stage_delta(before, STAGE_SECONDS.summary())
+
+            results[concurrency] = {"classify": classify_report, "classify_batch": batch_report}
+    return results
+
+
+def build_pipeline(args, data_path: str):
+    """Build and prepare a pipeline wired to the fakes, timing each startup phase"""
+    fake_model = FakeModelInference(
+        latency_ms=args.latency_ms,
+        per_token_ms=args.per_token_ms,
+        error_rate=args.error_rate
+    )
+    options = {}
+    for option in args.pipeline_option:
+        name, _, value = option.partition("=")
+        options[name] = json.loads(value)
+
+    timings = {}
+    start = time.perf_counter()
+    embedding_generator = None
+    if not args.real_embeddings:
+        embedding_generator = HashingEmbeddingGenerator()
+    classifier = TextClassifier(
+        api_key="", project_id="",
+        cache=LLMResultCache() if args.llm_cache else None,
+        model=fake_model
+    )
+    pipeline = ClassificationPipeline(
+        watsonx_api_key="",
+        watsonx_project_id="",
+        data_path=data_path,
+        embedding_generator=embedding_generator,
+        classifier=classifier,
+        **options
+    )
+    timings["init"] = time.perf_counter() - start
+
+    for phase, step in [
+        ("load_data", pipeline.load_and_prepare_data),
+        ("embeddings", pipeline.generate_embeddings),
+        ("frequency_buckets", pipeline.create_frequency_buckets),
+        ("examples", pipeline.prepare_examples),
+        ("compact", pipeline.compact_state),
+    ]:
+        start = time.perf_counter()
+        step()
+        timings[phase] = time.perf_counter() - start
+    return pipeline, fake_model, timings
+
+
+def print_report(report: Dict):
+    print("\nStartup (s):")
+    for phase, seconds in report["startup_seconds"].items():
+        print(f"  {phase:<20} {seconds:8.3f}")
+
+    for concurrency, result in report["runs"].items():
+        print(f"\nConcurrency {concurrency}:")
+        for endpoint, stats in result.items():
+            unit = "rows/s" if endpoint == "classify_batch" else "req/s"
+            print(
+                f"  {endpoint:<15} {stats['throughput_per_sec']:9.1f} {unit:<7}"
+                f" p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms"
+                f"  p99 {stats['p99_ms']:8.1f} ms  errors {stats['errors']}"
+            )
+            for name, stage_stats in stats["stages"].items():
+                print(f"      {name:<16} {stage_stats['mean_ms']:9.2f} ms  x{stage_stats['count']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    inputs = pd.read_csv(args.inputs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = args.data
+        if data_path is None:
+            data_path = os.path.join(tmp, "with_label.csv")
+            synthesize_training_data(inputs, args.training_rows, data_path)
+
+        pipeline, fake_model, startup = build_pipeline(args, data_path)
+
+        import main as app_module
+        app_module.pipeline = pipeline
+        runs = asyncio.run(benchmark_app(app_module.app, inputs, args, levels))
+
+    report = {
+        "startup_seconds": startup,
+        "runs": runs,
+        "llm_calls": fake_model.calls,
+        "config": vars(args),
+    }
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
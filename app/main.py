@@ -1,17 +1,146 @@
 """FastAPI application for text classification"""
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Header
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
+import argparse
+import asyncio
+import hmac
 import os
+import tempfile
 import pandas as pd
 import io
 from dotenv import load_dotenv
 from src.pipeline import ClassificationPipeline
+from src.category_matcher import CandidatePruning
+from src.llm_cache import LLMResultCache
+from src.llm_scheduler import CircuitOpenError, LLMScheduler, LLMTimeoutError
+from src.jobs import COMPLETED, BatchJobManager
+from src.batch_io import (
+    OUTPUT_FORMATS,
+    BatchResultWriter,
+    detect_encoding,
+    iter_csv_chunks,
+    stream_classified_rows,
+)
+from src.metrics import (
+    REGISTRY,
+    format_server_timing,
+    start_request_timing,
+)
+from src.readiness import FAILED, StartupProgress
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Maximum number of concurrent LLM calls when classifying a batch
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+# Threads for CPU-bound work (encoding, matching); defaults to the CPU count
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "0")) or None
+
+# Maximum number of concurrent Watsonx calls across /classify requests (and, with the
+# scheduler, across all requests and batches)
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "32"))
+
+# LLM call scheduler: interactive calls go before batch rows, batch rows use at most
+# LLM_BATCH_MAX_CONCURRENT of the MAX_CONCURRENT_LLM_CALLS slots (0: three quarters)
+LLM_SCHEDULER = os.getenv("LLM_SCHEDULER", "true").lower() == "true"
+LLM_BATCH_MAX_CONCURRENT = int(os.getenv("LLM_BATCH_MAX_CONCURRENT", "0")) or None
+# Calls started per second and burst size, matched to the Watsonx quota (0: no limit)
+LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "0")) or None
+LLM_RATE_BURST = float(os.getenv("LLM_RATE_BURST", "0")) or None
+# Per-attempt timeout, and retries of timeouts, throttling and server errors
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60")) or None
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+# Consecutive failures that open the circuit breaker, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Directory for persisted embedding artifacts (disabled when unset)
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR") or None
+
+# LLM result cache (LLM_CACHE_SIZE=0 disables it)
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "10000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "0")) or None
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH") or None
+
+# Micro-batching of concurrent /classify encodes (EMBED_BATCH_MAX_SIZE=1 disables it)
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+
+# Rows parsed and classified per chunk in streaming batch mode
+BATCH_STREAM_CHUNK_ROWS = int(os.getenv("BATCH_STREAM_CHUNK_ROWS", "64"))
+
+# Few-shot examples: "static" (fixed sample) or "knn" (most similar labeled rows)
+EXAMPLE_STRATEGY = os.getenv("EXAMPLE_STRATEGY", "static").lower()
+EXAMPLE_TOKEN_BUDGET = int(os.getenv("EXAMPLE_TOKEN_BUDGET", "1500"))
+EXAMPLE_MAX_WORDS = int(os.getenv("EXAMPLE_MAX_WORDS", "120"))
+MAX_EXAMPLES = int(os.getenv("MAX_EXAMPLES", "5"))
+
+# kNN fast path: answer without the LLM when kNN confidence reaches the threshold (disabled when unset)
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD")) if os.getenv("CASCADE_THRESHOLD") else None
+KNN_NEIGHBORS = int(os.getenv("KNN_NEIGHBORS", "15"))
+
+# Add a Server-Timing header with the per-stage breakdown to each response
+TIMING_HEADER = os.getenv("TIMING_HEADER", "false").lower() == "true"
+
+# Pages packed into one Watsonx prompt on the batch path (1 disables multi-page prompts)
+LLM_ITEMS_PER_PROMPT = int(os.getenv("LLM_ITEMS_PER_PROMPT", "1"))
+
+# Rows per chunk when reading a local training CSV (0 reads it at once)
+DATA_CHUNK_ROWS = int(os.getenv("DATA_CHUNK_ROWS", "0")) or None
+
+# Token for the admin endpoints such as POST /admin/reload (disabled when unset)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+
+# Reload the training data when its file mtime/size or COS ETag changes (0 disables polling)
+RELOAD_POLL_SECONDS = float(os.getenv("RELOAD_POLL_SECONDS", "0"))
+
+# Embedding backend (torch, torch-int8, onnx, onnx-int8), encode threads and optional ONNX file
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0")) or None
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE") or None
+
+# Adaptive candidate lists: cut the top k by score gap to the best candidate, cumulative
+# softmax mass or minimum adjusted score, keeping at least CANDIDATE_MIN (all unset keeps k)
+CANDIDATE_MIN = int(os.getenv("CANDIDATE_MIN", "10"))
+CANDIDATE_SCORE_GAP = float(os.getenv("CANDIDATE_SCORE_GAP")) if os.getenv("CANDIDATE_SCORE_GAP") else None
+CANDIDATE_MASS = float(os.getenv("CANDIDATE_MASS")) if os.getenv("CANDIDATE_MASS") else None
+CANDIDATE_MIN_SCORE = float(os.getenv("CANDIDATE_MIN_SCORE")) if os.getenv("CANDIDATE_MIN_SCORE") else None
+
+# Let concurrent identical /classify requests share one computation
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+
+# Storage type of the training text embedding matrix: float32, or float16 to halve it
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32").lower()
+
+# Categories: a label path level (default 3), or "full" for full label paths searched
+# level by level, expanding the TAXONOMY_BEAM_WIDTH best nodes per level, with the
+# routing bucket bonus scaled per level by TAXONOMY_LEVEL_WEIGHTS (top level first)
+CATEGORY_LEVEL = os.getenv("CATEGORY_LEVEL", "3").lower()
+TAXONOMY_BEAM_WIDTH = int(os.getenv("TAXONOMY_BEAM_WIDTH", "20"))
+TAXONOMY_LEVEL_WEIGHTS = [float(w) for w in os.getenv("TAXONOMY_LEVEL_WEIGHTS", "1.0").split(",") if w.strip()]
+
+# Worker processes started by `python main.py` (uvicorn's own CLI reads the same variable)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Prepared state built once and memory-mapped by every worker; on by default with several workers
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR") or (
+    os.path.join(tempfile.gettempdir(), "classification-snapshot") if WEB_CONCURRENCY > 1 else None
+)
+
+# Only memory-map a snapshot built ahead of time (python main.py --build-snapshot) for the
+# current settings, instead of checking the training data source against it
+SNAPSHOT_PREBUILT = os.getenv("SNAPSHOT_PREBUILT", "false").lower() == "true"
+
+# Asynchronous batch jobs: checkpoint directory (keep it on persistent storage so jobs
+# survive restarts), rows per checkpoint and jobs processed at once per worker
+JOBS_DIR = os.getenv("JOBS_DIR") or os.path.join(tempfile.gettempdir(), "classification-jobs")
+JOB_CHUNK_ROWS = int(os.getenv("JOB_CHUNK_ROWS", "500"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+
 app = FastAPI(
     title="Text Classification API",
     description="Multi-label text classification using embeddings and LLM",
@@ -21,6 +150,16 @@ app = FastAPI(
 # Global pipeline instance
 pipeline = None
 
+# Background task polling the training data for changes
+reload_poller = None
+
+# Asynchronous batch jobs
+job_manager = None
+
+# Progress of the background startup, and the task running it
+startup_progress = None
+startup_task = None
+
 
 class ClassificationRequest(BaseModel):
     url: str
@@ -38,11 +177,21 @@ class BatchClassificationResponse(BaseModel):
     results: List[ClassificationResponse]
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize pipeline on startup"""
-    global pipeline
+def _validate_environment():
+    """Fail fast on missing credentials, before any background work starts"""
+    if not os.getenv("WATSONX_API_KEY") or not os.getenv("WATSONX_PROJECT_ID"):
+        raise ValueError("WATSONX_API_KEY and WATSONX_PROJECT_ID must be set")
     
+    # Validate COS credentials if COS is enabled
+    use_cos = os.getenv("USE_COS", "false").lower() == "true"
+    if use_cos and not all([os.getenv("COS_API_KEY"), os.getenv("COS_ENDPOINT"), os.getenv("COS_BUCKET")]):
+        raise ValueError(
+            "When USE_COS=true, COS_API_KEY, COS_ENDPOINT, and COS_BUCKET must be set"
+        )
+
+
+def create_pipeline() -> ClassificationPipeline:
+    """Create the pipeline from the environment, without loading any data"""
     # Get credentials from environment variables
     watsonx_api_key = os.getenv("WATSONX_API_KEY")
     watsonx_project_id = os.getenv("WATSONX_PROJECT_ID")
@@ -54,18 +203,30 @@ async def startup_event():
     cos_endpoint = os.getenv("COS_ENDPOINT")
     cos_bucket = os.getenv("COS_BUCKET")
     cos_object_key = os.getenv("COS_OBJECT_KEY", "with_label.csv")
+    cos_cache_dir = os.getenv("COS_CACHE_DIR") or None
     
-    if not watsonx_api_key or not watsonx_project_id:
-        raise ValueError("WATSONX_API_KEY and WATSONX_PROJECT_ID must be set")
+    llm_cache = None
+    if LLM_CACHE_SIZE > 0:
+        llm_cache = LLMResultCache(
+            max_size=LLM_CACHE_SIZE,
+            ttl_seconds=LLM_CACHE_TTL,
+            db_path=LLM_CACHE_PATH
+        )
     
-    # Validate COS credentials if COS is enabled
-    if use_cos and not all([cos_api_key, cos_endpoint, cos_bucket]):
-        raise ValueError(
-            "When USE_COS=true, COS_API_KEY, COS_ENDPOINT, and COS_BUCKET must be set"
+    llm_scheduler = None
+    if LLM_SCHEDULER:
+        llm_scheduler = LLMScheduler(
+            max_concurrent=MAX_CONCURRENT_LLM_CALLS,
+            max_batch_concurrent=LLM_BATCH_MAX_CONCURRENT,
+            rate_per_second=LLM_RATE_LIMIT,
+            burst=LLM_RATE_BURST,
+            timeout_seconds=LLM_TIMEOUT_SECONDS,
+            max_retries=LLM_MAX_RETRIES,
+            failure_threshold=LLM_BREAKER_FAILURES,
+            reset_seconds=LLM_BREAKER_RESET_SECONDS
         )
     
-    # Initialize and prepare pipeline
-    pipeline = ClassificationPipeline(
+    return ClassificationPipeline(
         watsonx_api_key=watsonx_api_key,
         watsonx_project_id=watsonx_project_id,
         data_path=data_path,
@@ -73,13 +234,189 @@ async def startup_event():
         cos_api_key=cos_api_key,
         cos_endpoint=cos_endpoint,
         cos_bucket=cos_bucket,
-        cos_object_key=cos_object_key
+        cos_object_key=cos_object_key,
+        cpu_workers=CPU_WORKERS,
+        max_concurrent_llm_calls=MAX_CONCURRENT_LLM_CALLS,
+        embedding_cache_dir=EMBEDDING_CACHE_DIR,
+        llm_cache=llm_cache,
+        llm_scheduler=llm_scheduler,
+        embed_batch_max_size=EMBED_BATCH_MAX_SIZE,
+        embed_batch_max_wait_ms=EMBED_BATCH_MAX_WAIT_MS,
+        example_strategy=EXAMPLE_STRATEGY,
+        example_token_budget=EXAMPLE_TOKEN_BUDGET,
+        example_max_words=EXAMPLE_MAX_WORDS,
+        max_examples=MAX_EXAMPLES,
+        cascade_threshold=CASCADE_THRESHOLD,
+        knn_neighbors=KNN_NEIGHBORS,
+        llm_items_per_prompt=LLM_ITEMS_PER_PROMPT,
+        data_chunksize=DATA_CHUNK_ROWS,
+        cos_cache_dir=cos_cache_dir,
+        snapshot_dir=SNAPSHOT_DIR,
+        embedding_backend=EMBEDDING_BACKEND,
+        embedding_threads=EMBEDDING_THREADS,
+        embedding_onnx_file=EMBEDDING_ONNX_FILE,
+        coalesce_requests=COALESCE_REQUESTS,
+        candidate_pruning=CandidatePruning(
+            min_candidates=CANDIDATE_MIN,
+            score_gap=CANDIDATE_SCORE_GAP,
+            cumulative_mass=CANDIDATE_MASS,
+            min_score=CANDIDATE_MIN_SCORE
+        ),
+        embedding_dtype=EMBEDDING_DTYPE,
+        category_level=None if CATEGORY_LEVEL == "full" else int(CATEGORY_LEVEL),
+        taxonomy_beam_width=TAXONOMY_BEAM_WIDTH,
+        taxonomy_level_weights=TAXONOMY_LEVEL_WEIGHTS
     )
+
+
+def _prepare_pipeline(progress: StartupProgress) -> ClassificationPipeline:
+    """Create and prepare the pipeline phase by phase, recording progress (blocking)"""
+    with progress.phase("init"):
+        prepared = create_pipeline()
+    
+    if SNAPSHOT_DIR:
+        # Built by the first worker (or ahead of time with --build-snapshot), memory-mapped by the rest
+        with progress.phase("snapshot"):
+            prepared.prepare_from_snapshot(prebuilt=SNAPSHOT_PREBUILT)
+    else:
+        with progress.phase("load_data"):
+            prepared.load_and_prepare_data()
+        with progress.phase("embeddings"):
+            prepared.generate_embeddings()
+        with progress.phase("frequency_buckets"):
+            prepared.create_frequency_buckets()
+        with progress.phase("examples"):
+            prepared.prepare_examples()
+        with progress.phase("compact"):
+            prepared.compact_state()
+    
+    # Run one text through every stage so the first request does not pay for lazy initialization
+    with progress.phase("warmup"):
+        prepared.warm_up()
+    return prepared
+
+
+def _startup_phases() -> List[str]:
+    """Names of the startup phases, in the order they run"""
+    if SNAPSHOT_DIR:
+        preparation = ["snapshot"]
+    else:
+        preparation = ["load_data", "embeddings", "frequency_buckets", "examples", "compact"]
+    return ["init", *preparation, "warmup"]
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Validate the configuration and prepare the pipeline in the background"""
+    global startup_progress, startup_task
     
-    pipeline.load_and_prepare_data()
-    pipeline.generate_embeddings()
-    pipeline.create_frequency_buckets()
-    pipeline.prepare_examples()
+    _validate_environment()
+    
+    # The server accepts connections right away; /ready reports when the pipeline is prepared
+    startup_progress = StartupProgress(_startup_phases())
+    startup_task = asyncio.create_task(_startup_in_background())
+
+
+async def _startup_in_background():
+    """Prepare the pipeline, then start the batch jobs and the reload poller"""
+    global pipeline, reload_poller, job_manager
+    
+    try:
+        pipeline = await run_in_threadpool(_prepare_pipeline, startup_progress)
+        _print_memory_report()
+        
+        # Pick up jobs interrupted by the previous shutdown from their last checkpoint
+        job_manager = BatchJobManager(
+            pipeline,
+            JOBS_DIR,
+            chunk_rows=JOB_CHUNK_ROWS,
+            max_jobs=JOB_WORKERS,
+            max_concurrency=BATCH_LLM_CONCURRENCY
+        )
+        resumed = job_manager.resume()
+        if resumed:
+            print(f"Resuming {len(resumed)} batch job(s)")
+        
+        if RELOAD_POLL_SECONDS > 0:
+            reload_poller = asyncio.create_task(_poll_training_data())
+    except Exception as e:
+        print(f"Startup failed: {e}")
+        startup_progress.finish(e)
+        return
+    startup_progress.finish()
+
+
+def _print_memory_report():
+    """Print the memory held by each part of the serving state"""
+    usage = pipeline.state.memory_usage()
+    total = sum(part["bytes"] for part in usage.values() if not part["mapped"])
+    print(f"Serving state memory: {total / 2**20:.1f} MiB private")
+    for name, part in usage.items():
+        shared = " (memory-mapped, shared)" if part["mapped"] else ""
+        print(f"  {name:<20} {part['bytes'] / 2**20:9.2f} MiB{shared}")
+
+
+async def _poll_training_data():
+    """Reload the training data whenever its source changes"""
+    while True:
+        await asyncio.sleep(RELOAD_POLL_SECONDS)
+        try:
+            await run_in_threadpool(pipeline.reload_if_changed)
+        except Exception as e:
+            print(f"Training data reload failed: {e}")
+
+
+@app.middleware("http")
+async def stage_timing(request: Request, call_next):
+    """Collect per-stage timings for the request and optionally report them"""
+    timings = start_request_timing()
+    response = await call_next(request)
+    if TIMING_HEADER and timings:
+        response.headers["Server-Timing"] = format_server_timing(timings)
+    return response
+
+
+def _pipeline_stats():
+    """Export cache, batcher and cascade stats as gauges on /metrics"""
+    if pipeline is None:
+        return
+    cache = pipeline.classifier.cache
+    if cache is not None:
+        cache_stats = cache.stats()
+        yield "llm_cache_hits", "LLM cache hits", {}, cache_stats["hits"]
+        yield "llm_cache_misses", "LLM cache misses", {}, cache_stats["misses"]
+        yield "llm_cache_size", "Entries in the in-memory LLM cache", {}, cache_stats["size"]
+    batcher = pipeline.embedding_batcher
+    if batcher is not None:
+        batcher_stats = batcher.stats()
+        yield "embedding_batches", "Micro-batched encode calls", {}, batcher_stats["batches"]
+        yield "embedding_batched_items", "Texts encoded through the micro-batcher", {}, batcher_stats["items"]
+    cascade = pipeline.cascade_stats()
+    yield "cascade_texts", "Texts by cascade outcome", {"outcome": "knn"}, cascade["knn_accepted"]
+    yield "cascade_texts", "Texts by cascade outcome", {"outcome": "llm"}, cascade["llm_escalated"]
+    yield "cascade_escalation_rate", "Share of texts escalated to the LLM", {}, cascade["escalation_rate"]
+    scheduler = pipeline.classifier.scheduler
+    if scheduler is not None:
+        scheduler_stats = scheduler.stats()
+        for lane, depth in scheduler_stats["queued"].items():
+            yield "llm_queue_depth", "LLM calls waiting in the scheduler, by lane", {"lane": lane}, depth
+        for lane, running in scheduler_stats["running"].items():
+            yield "llm_running_calls", "LLM calls in progress, by lane", {"lane": lane}, running
+        yield "llm_abandoned_calls", "Timed-out LLM calls still occupying a thread", {}, scheduler_stats["abandoned"]
+        yield "llm_circuit_open", "Whether the LLM circuit breaker is rejecting calls (1) or not (0)", {}, int(scheduler_stats["circuit"] == "open")
+    if pipeline.singleflight is not None:
+        coalescing = pipeline.singleflight.stats()
+        yield "classify_coalescing_rate", "Share of /classify requests served by an identical in-flight request", {}, coalescing["coalescing_rate"]
+        yield "classify_in_flight", "Distinct /classify computations in progress", {}, coalescing["in_flight"]
+    for name, part in pipeline.state.memory_usage().items():
+        yield "serving_state_bytes", "Approximate memory held by each serving state component", {"component": name, "mapped": str(part["mapped"]).lower()}, part["bytes"]
+    yield "serving_state_generation", "Training data version being served", {}, pipeline.state.generation
+    if job_manager is not None:
+        for status, count in job_manager.stats().items():
+            yield "batch_jobs", "Batch jobs by status", {"status": status}, count
+
+
+REGISTRY.register_collector(_pipeline_stats)
 
 
 @app.get("/")
@@ -93,10 +430,65 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Health check endpoint"""
+    """Liveness check; only fails when the startup failed"""
+    if startup_progress is not None and startup_progress.status == FAILED:
+        raise HTTPException(status_code=503, detail=f"Startup failed: {startup_progress.error}")
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness check with the progress and duration of each startup phase"""
+    if startup_progress is None:
+        raise HTTPException(status_code=503, detail="Startup has not begun")
+    report = startup_progress.report()
+    return JSONResponse(report, status_code=200 if startup_progress.ready else 503)
+
+
+@app.get("/stats")
+async def stats():
+    """Runtime statistics for the pipeline caches"""
+    if pipeline is None:
+        raise HTTPException(status_code=503, detail="Pipeline not initialized")
+    
+    cache = pipeline.classifier.cache
+    batcher = pipeline.embedding_batcher
+    return {
+        "llm_cache": cache.stats() if cache is not None else None,
+        "embedding_batcher": batcher.stats() if batcher is not None else None,
+        "llm_scheduler": pipeline.classifier.scheduler.stats() if pipeline.classifier.scheduler is not None else None,
+        "cascade": pipeline.cascade_stats(),
+        "coalescing": pipeline.singleflight.stats() if pipeline.singleflight is not None else None,
+        "reload": pipeline.reload_stats(),
+        "jobs": job_manager.stats() if job_manager is not None else None,
+        "memory": pipeline.state.memory_usage()
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/admin/reload", status_code=202)
+async def reload_training_data(x_admin_token: Optional[str] = Header(None)):
+    """Reload the training data in the background and swap it in when ready"""
+    if pipeline is None:
+        raise HTTPException(status_code=503, detail="Pipeline not initialized")
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN")
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    
+    if not pipeline.start_reload():
+        raise HTTPException(status_code=409, detail="A reload is already in progress")
+    return {
+        "status": "reloading",
+        "generation": pipeline.state.generation
+    }
+
+
 @app.post("/classify", response_model=ClassificationResponse)
 async def classify_text(request: ClassificationRequest):
     """Classify text into categories"""
@@ -104,7 +496,7 @@ async def classify_text(request: ClassificationRequest):
         raise HTTPException(status_code=503, detail="Pipeline not initialized")
     
     try:
-        categories = pipeline.classify_text(
+        categories = await pipeline.aclassify_text(
             url=request.url,
             text=request.text,
             k=request.k
@@ -114,6 +506,14 @@ async def classify_text(request: ClassificationRequest):
             url=request.url,
             categories=categories
         )
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Classification failed: {str(e)}",
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Classification failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Classification failed: {str(e)}")
 
@@ -130,10 +530,68 @@ async def get_categories():
     }
 
 
+async def _stream_batch(file: UploadFile, k: int, output_format: str) -> StreamingResponse:
+    """Classify an uploaded CSV chunk by chunk and stream the output rows"""
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"output_format must be one of: {', '.join(OUTPUT_FORMATS)}"
+        )
+    
+    # Detect the encoding with a bounded-memory pass over the spooled upload
+    encoding = await run_in_threadpool(detect_encoding, file.file)
+    if encoding is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Unable to decode CSV file. Please ensure it's properly encoded."
+        )
+    
+    # Parse the first chunk up front so bad input is still reported as a 400
+    chunks = iter_csv_chunks(file.file, encoding, chunksize=BATCH_STREAM_CHUNK_ROWS)
+    try:
+        first_chunk = await run_in_threadpool(next, chunks, None)
+    except pd.errors.EmptyDataError:
+        raise HTTPException(status_code=400, detail="Uploaded CSV file is empty")
+    except pd.errors.ParserError:
+        raise HTTPException(status_code=400, detail="Invalid CSV file format")
+    
+    if first_chunk is None:
+        raise HTTPException(status_code=400, detail="Uploaded CSV file is empty")
+    if 'url' not in first_chunk.columns or 'text' not in first_chunk.columns:
+        raise HTTPException(
+            status_code=400,
+            detail="CSV must contain 'url' and 'text' columns"
+        )
+    
+    def all_chunks():
+        yield first_chunk
+        yield from chunks
+    
+    writer = BatchResultWriter(list(first_chunk.columns), output_format)
+    extension = "csv" if output_format == "csv" else "ndjson"
+    filename = os.path.splitext(file.filename)[0]
+    
+    return StreamingResponse(
+        stream_classified_rows(
+            pipeline,
+            all_chunks(),
+            writer,
+            k=k,
+            max_concurrency=BATCH_LLM_CONCURRENCY
+        ),
+        media_type=writer.media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=classified_{filename}.{extension}"
+        }
+    )
+
+
 @app.post("/classify/batch")
 async def classify_batch(
     file: UploadFile = File(...),
-    k: Optional[int] = 55
+    k: Optional[int] = 55,
+    stream: bool = False,
+    output_format: str = "csv"
 ):
     """
     Batch classify texts from uploaded CSV file.
@@ -142,7 +600,12 @@ async def classify_batch(
     - Must have 'url' and 'text' columns
     - Optional: any other columns will be preserved in output
     
-    Returns a CSV file with original columns plus 'categories' column
+    Returns a CSV file with original columns plus 'categories' column.
+    
+    With stream=true the upload is parsed and classified in chunks and each
+    output row is sent as soon as it is ready, as CSV or, with
+    output_format=ndjson, one JSON object per line (failed rows carry an
+    'error' field).
     """
     if pipeline is None:
         raise HTTPException(status_code=503, detail="Pipeline not initialized")
@@ -151,6 +614,9 @@ async def classify_batch(
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are supported")
     
+    if stream:
+        return await _stream_batch(file, k, output_format)
+    
     try:
         # Read uploaded CSV file
         contents = await file.read()
@@ -179,20 +645,20 @@ async def classify_batch(
                 detail="CSV must contain 'url' and 'text' columns"
             )
         
-        # Process each row
+        # Classify all rows in bulk, preserving row order
+        outcomes = await run_in_threadpool(
+            pipeline.classify_batch,
+            urls=df['url'].astype(str).tolist(),
+            texts=df['text'].astype(str).tolist(),
+            k=k,
+            max_concurrency=BATCH_LLM_CONCURRENCY
+        )
         results = []
-        for idx, row in df.iterrows():
-            try:
-                categories = pipeline.classify_text(
-                    url=str(row['url']),
-                    text=str(row['text']),
-                    k=k
-                )
-                results.append(categories)
-            except Exception as e:
+        for idx, (categories, error) in zip(df.index, outcomes):
+            if error is not None:
                 # If classification fails for a row, append empty list
-                results.append([])
-                print(f"Error processing row {idx}: {str(e)}")
+                print(f"Error processing row {idx}: {error}")
+            results.append(categories)
         
         # Add categories column to dataframe
         df['categories'] = results
@@ -222,6 +688,90 @@ async def classify_batch(
         )
 
 
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...), k: Optional[int] = 55):
+    """
+    Submit a CSV file for classification in the background
+    
+    The CSV must have 'url' and 'text' columns. Poll GET /jobs/{job_id} for
+    progress and fetch the output from GET /jobs/{job_id}/results once the
+    job is completed.
+    """
+    if job_manager is None:
+        raise HTTPException(status_code=503, detail="Pipeline not initialized")
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Only CSV files are supported")
+    
+    try:
+        return await run_in_threadpool(job_manager.submit, file.file, file.filename, k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and progress of a batch job"""
+    if job_manager is None:
+        raise HTTPException(status_code=503, detail="Pipeline not initialized")
+    status = job_manager.get(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, output_format: str = "csv"):
+    """Output of a completed batch job as CSV or NDJSON"""
+    if job_manager is None:
+        raise HTTPException(status_code=503, detail="Pipeline not initialized")
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"output_format must be one of: {', '.join(OUTPUT_FORMATS)}"
+        )
+    status = job_manager.get(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if status["status"] != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {status['status']}")
+    
+    extension = "csv" if output_format == "csv" else "ndjson"
+    filename = os.path.splitext(status["filename"])[0]
+    return StreamingResponse(
+        job_manager.iter_results(job_id, output_format),
+        media_type=OUTPUT_FORMATS[output_format],
+        headers={
+            "Content-Disposition": f"attachment; filename=classified_{filename}.{extension}"
+        }
+    )
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a batch job and delete its checkpoints and results"""
+    if job_manager is None:
+        raise HTTPException(status_code=503, detail="Pipeline not initialized")
+    if not await run_in_threadpool(job_manager.cancel, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"id": job_id, "status": "cancelled"}
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Text Classification API")
+    parser.add_argument("--build-snapshot", action="store_true",
+                        help="Build the prepared state snapshot in SNAPSHOT_DIR and exit")
+    args = parser.parse_args()
+    if args.build_snapshot:
+        if not SNAPSHOT_DIR:
+            raise SystemExit("--build-snapshot requires SNAPSHOT_DIR")
+        _validate_environment()
+        create_pipeline().prepare_from_snapshot()
+        print(f"Snapshot written to {SNAPSHOT_DIR}")
+        raise SystemExit(0)
+    
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    if WEB_CONCURRENCY > 1:
+        # Workers import the app by name; each one runs startup_event
+        uvicorn.run("main:app", host="0.0.0.0", port=8080, workers=WEB_CONCURRENCY)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8080)
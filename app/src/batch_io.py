@@ -0,0 +1,157 @@
+"""Chunked CSV input and streaming CSV/NDJSON output for batch classification"""
+import codecs
+import csv
+import io
+import json
+import math
+import pandas as pd
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+ENCODINGS = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
+OUTPUT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def detect_encoding(
+    stream: BinaryIO,
+    encodings: Iterable[str] = ENCODINGS,
+    block_size: int = 1 << 20
+) -> Optional[str]:
+    """
+    Find the first encoding that decodes the whole stream
+
+    The stream is decoded block by block, so memory use does not depend
+    on its size. The stream is rewound before returning.
+
+    Args:
+        stream: Seekable binary stream
+        encodings: Candidate encodings, in order of preference
+        block_size: Bytes decoded per step
+
+    Returns:
+        The matching encoding, or None if none of them decode the stream
+    """
+    for encoding in encodings:
+        stream.seek(0)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            while True:
+                block = stream.read(block_size)
+                if not block:
+                    decoder.decode(b"", final=True)
+                    break
+                decoder.decode(block)
+        except UnicodeDecodeError:
+            continue
+        finally:
+            stream.seek(0)
+        return encoding
+    return None
+
+
+def iter_csv_chunks(stream: BinaryIO, encoding: str, chunksize: int = 64) -> Iterator[pd.DataFrame]:
+    """
+    Parse a binary CSV stream into DataFrames of at most chunksize rows
+
+    Args:
+        stream: Binary stream positioned at the start of the CSV
+        encoding: Text encoding of the stream
+        chunksize: Rows per DataFrame
+
+    Returns:
+        Iterator over DataFrame chunks
+    """
+    text = io.TextIOWrapper(stream, encoding=encoding, newline="")
+    try:
+        yield from pd.read_csv(text, chunksize=chunksize)
+    finally:
+        # Leave the underlying stream open for its owner
+        text.detach()
+
+
+def _clean(value):
+    """Convert missing values to None for output"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+class BatchResultWriter:
+    """Serialize classified rows one at a time as CSV or NDJSON"""
+
+    def __init__(self, columns: List[str], output_format: str = "csv"):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        self.columns = list(columns)
+        self.output_format = output_format
+        self.media_type = OUTPUT_FORMATS[output_format]
+
+    def header(self) -> str:
+        """Header line (CSV only)"""
+        if self.output_format != "csv":
+            return ""
+        return self._csv_line(self.columns + ["categories"])
+
+    @staticmethod
+    def _csv_line(values: list) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerow(values)
+        return buffer.getvalue()
+
+    def row(self, values: list, categories: List[str], error: Optional[str] = None) -> str:
+        """Serialize one input row with its predicted categories"""
+        values = [_clean(v) for v in values]
+        if self.output_format == "csv":
+            return self._csv_line(["" if v is None else v for v in values] + [str(categories)])
+
+        record = dict(zip(self.columns, values))
+        record["categories"] = categories
+        if error is not None:
+            record["error"] = error
+        return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+def stream_classified_rows(
+    pipeline,
+    chunks: Iterable[pd.DataFrame],
+    writer: BatchResultWriter,
+    k: int = 55,
+    max_concurrency: int = 8
+) -> Iterator[str]:
+    """
+    Classify CSV chunks and yield serialized output rows as they complete
+
+    Only one chunk is held in memory at a time and rows are emitted in
+    input order as soon as they and the rows before them are classified.
+
+    Args:
+        pipeline: ClassificationPipeline used for classification
+        chunks: DataFrames with at least 'url' and 'text' columns
+        writer: Serializer for output rows
+        k: Number of candidate categories per text
+        max_concurrency: Maximum number of concurrent LLM calls
+
+    Returns:
+        Iterator over serialized output lines
+    """
+    header = writer.header()
+    if header:
+        yield header
+
+    row_number = 0
+    for chunk in chunks:
+        outcomes: Iterator[Tuple[List[str], Optional[str]]] = pipeline.iter_classify_batch(
+            urls=chunk['url'].astype(str).tolist(),
+            texts=chunk['text'].astype(str).tolist(),
+            k=k,
+            max_concurrency=max_concurrency
+        )
+        for values, (categories, error) in zip(chunk.itertuples(index=False, name=None), outcomes):
+            if error is not None:
+                print(f"Error processing row {row_number}: {error}")
+            yield writer.row(list(values), categories, error)
+            row_number += 1
@@ -0,0 +1,108 @@
+"""Dynamic micro-batching of concurrent embedding requests"""
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from typing import Any, Dict
+
+
+class EmbeddingMicroBatcher:
+    """Collect concurrent single-text encode requests into one batched encode call"""
+
+    def __init__(
+        self,
+        embedding_generator,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        Initialize the batcher and start its worker thread
+
+        Args:
+            embedding_generator: EmbeddingGenerator used for the batched encode calls
+            max_batch_size: Maximum number of texts per encode call
+            max_wait_ms: Maximum time to wait for more requests after the first one arrives
+        """
+        self.embedding_generator = embedding_generator
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+
+        self._worker = threading.Thread(
+            target=self._run, name="embedding-batcher", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for encoding and return a future for its embedding"""
+        if self._closed:
+            raise RuntimeError("EmbeddingMicroBatcher is closed")
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode_one(self, text: str) -> np.ndarray:
+        """Encode a single text, blocking until its batch has been processed"""
+        return self.submit(text).result()
+
+    def _collect(self, first) -> list:
+        """Gather requests until the batch is full or the wait deadline passes"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [
+                (text, future) for text, future in self._collect(first)
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            try:
+                embeddings = self.embedding_generator.encode([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+    def close(self):
+        """Stop the worker thread after pending requests are processed"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch counters"""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0
+        }
@@ -1,18 +1,72 @@
 """Category matching using cosine similarity with frequency bucketing"""
-from sklearn.metrics.pairwise import cosine_similarity
 from collections import Counter
-from typing import List, Dict, Tuple
-import pandas as pd
+from typing import List, Dict, Optional
+import numpy as np
+
+
+class CandidatePruning:
+    """Rules that cut a ranked candidate list short when the scores are peaked"""
+
+    def __init__(
+        self,
+        min_candidates: int = 10,
+        score_gap: Optional[float] = None,
+        cumulative_mass: Optional[float] = None,
+        min_score: Optional[float] = None,
+        temperature: float = 0.05
+    ):
+        """
+        Initialize the rules; candidates are kept while every enabled rule keeps them
+
+        Args:
+            min_candidates: Candidates always kept (the requested k is the upper bound)
+            score_gap: Keep candidates scoring within this distance of the best one
+            cumulative_mass: Keep the shortest prefix holding this share of the
+                softmax probability mass of the top-k scores
+            min_score: Keep candidates with at least this adjusted score
+            temperature: Softmax temperature for cumulative_mass
+        """
+        self.min_candidates = min_candidates
+        self.score_gap = score_gap
+        self.cumulative_mass = cumulative_mass
+        self.min_score = min_score
+        self.temperature = temperature
+
+    @property
+    def enabled(self) -> bool:
+        return any(rule is not None for rule in (self.score_gap, self.cumulative_mass, self.min_score))
+
+    def lengths(self, sorted_scores: np.ndarray) -> np.ndarray:
+        """
+        Number of candidates to keep per row
+
+        Args:
+            sorted_scores: Top-k adjusted scores per text, in descending order
+
+        Returns:
+            Integer array with one length per row, between min_candidates and k
+        """
+        k = sorted_scores.shape[1]
+        lengths = np.full(sorted_scores.shape[0], k, dtype=np.intp)
+        if self.min_score is not None:
+            lengths = np.minimum(lengths, (sorted_scores >= self.min_score).sum(axis=1))
+        if self.score_gap is not None:
+            within = sorted_scores >= sorted_scores[:, :1] - self.score_gap
+            lengths = np.minimum(lengths, within.sum(axis=1))
+        if self.cumulative_mass is not None and k:
+            logits = (sorted_scores - sorted_scores[:, :1]) / self.temperature
+            mass = np.cumsum(np.exp(logits), axis=1)
+            mass /= mass[:, -1:]
+            lengths = np.minimum(lengths, (mass < self.cumulative_mass).sum(axis=1) + 1)
+        return np.clip(lengths, min(self.min_candidates, k), k)
 
 
 class CategoryMatcher:
     """Match text to categories using cosine similarity with frequency bucketing"""
-    
+
     def __init__(self, categories: List[str], category_embeddings: list):
-        self.category_df = pd.DataFrame({
-            "category": categories,
-            "embedding": category_embeddings
-        })
+        self.categories = list(categories)
+        self.category_matrix = self._normalize(category_embeddings)
         self.bucket_weights = {
             "very high": 0.25,
             "high": 0.2,
@@ -20,40 +74,123 @@ class CategoryMatcher:
             "low": 0.05,
             "none": 0.0,
         }
-    
+        # Bonus vector aligned with self.categories, built from a bucket map
+        self.bucket_map = None
+        self.bonus_vector = self.build_bonus_vector({})
+
+    @staticmethod
+    def _normalize(embeddings) -> np.ndarray:
+        """Stack embeddings into a contiguous, L2-normalized float32 matrix"""
+        matrix = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
     def create_frequency_buckets(self, label_counts: Counter) -> Dict[str, str]:
         """Create frequency buckets for categories"""
-        bucket_map = {}
-        for cat, freq in label_counts.items():
-            if freq >= 30:
-                bucket_map[cat] = "very high"
-            elif freq >= 20:
-                bucket_map[cat] = "high"
-            elif freq >= 9:
-                bucket_map[cat] = "medium"
-            elif freq >= 4:
-                bucket_map[cat] = "low"
-            else:
-                bucket_map[cat] = "none"
+        bucket_map = {cat: self.frequency_bucket(freq) for cat, freq in label_counts.items()}
+        self.set_bucket_map(bucket_map)
         return bucket_map
-    
+
+    @staticmethod
+    def frequency_bucket(freq: int) -> str:
+        """Frequency bucket of a category seen freq times in the training data"""
+        if freq >= 30:
+            return "very high"
+        if freq >= 20:
+            return "high"
+        if freq >= 9:
+            return "medium"
+        if freq >= 4:
+            return "low"
+        return "none"
+
+    def set_bucket_map(self, bucket_map: Dict[str, str]):
+        """Use a bucket map (e.g. one loaded from a snapshot) as the default for scoring"""
+        self.bucket_map = bucket_map
+        self.bonus_vector = self.build_bonus_vector(bucket_map)
+
+    def build_bonus_vector(self, bucket_map: Dict[str, str]) -> np.ndarray:
+        """Build the per-category bucket bonus vector (missing categories count as "low")"""
+        return np.array(
+            [self.bucket_weights.get(bucket_map.get(cat, "low"), 0.0) for cat in self.categories],
+            dtype=np.float32
+        )
+
+    def _bonuses_for(self, bucket_map: Optional[Dict[str, str]]) -> np.ndarray:
+        """Return the bonus vector for a bucket map, reusing the precomputed one when possible"""
+        if bucket_map is None or bucket_map is self.bucket_map:
+            return self.bonus_vector
+        return self.build_bonus_vector(bucket_map)
+
+    def nbytes(self) -> int:
+        """Memory held by the scoring arrays"""
+        return int(self.category_matrix.nbytes + self.bonus_vector.nbytes)
+
+    def similarity(self, text_embeddings) -> np.ndarray:
+        """Cosine similarity of each text to each category, shape (n_texts, n_categories)"""
+        return self._normalize(text_embeddings) @ self.category_matrix.T
+
+    def score(
+        self,
+        text_embeddings,
+        bucket_map: Optional[Dict[str, str]] = None
+    ) -> np.ndarray:
+        """Adjusted scores (cosine similarity plus bucket bonus), shape (n_texts, n_categories)"""
+        return self.similarity(text_embeddings) + self._bonuses_for(bucket_map)
+
+    @staticmethod
+    def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Indices of the k highest scores per row, ordered by descending score
+
+        A negative k keeps all but the last -k, like slicing a sorted list with [:k].
+        """
+        n = scores.shape[1]
+        if k < 0:
+            k += n
+        k = max(0, min(k, n))
+        if k == 0:
+            return np.empty((scores.shape[0], 0), dtype=np.intp)
+        if k < n:
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            part = np.broadcast_to(np.arange(n), (scores.shape[0], n))
+        part_scores = np.take_along_axis(scores, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind="stable")
+        return np.take_along_axis(part, order, axis=1)
+
     def get_top_k_categories(
-        self, 
-        text_embedding: list, 
-        bucket_map: Dict[str, str], 
-        k: int = 55
+        self,
+        text_embedding: list,
+        bucket_map: Optional[Dict[str, str]] = None,
+        k: int = 55,
+        pruning: Optional[CandidatePruning] = None
     ) -> List[str]:
         """Get top k categories using cosine similarity with frequency bucketing"""
-        sims = cosine_similarity([text_embedding], list(self.category_df['embedding']))[0]
-        
-        adjusted_scores = []
-        for idx, cat_row in self.category_df.iterrows():
-            cat = cat_row['category']
-            sim = sims[idx]
-            bucket = bucket_map.get(cat, "low")
-            bonus = self.bucket_weights.get(bucket, 0.0)
-            adjusted = sim + bonus
-            adjusted_scores.append((cat, adjusted))
-        
-        top_k = sorted(adjusted_scores, key=lambda x: x[1], reverse=True)[:k]
-        return [cat for cat, _ in top_k]
+        return self.get_top_k_categories_batch(
+            [text_embedding], bucket_map=bucket_map, k=k, pruning=pruning
+        )[0]
+
+    def get_top_k_categories_batch(
+        self,
+        text_embeddings,
+        bucket_map: Optional[Dict[str, str]] = None,
+        k: int = 55,
+        pruning: Optional[CandidatePruning] = None
+    ) -> List[List[str]]:
+        """
+        Get top k categories for many text embeddings with a single matrix product
+
+        With pruning, each list is cut to the length its rules allow, with k
+        as the upper bound.
+        """
+        scores = self.score(text_embeddings, bucket_map)
+        top_k = self._top_k_indices(scores, k)
+        if pruning is None or not pruning.enabled:
+            return [[self.categories[i] for i in row] for row in top_k]
+
+        lengths = pruning.lengths(np.take_along_axis(scores, top_k, axis=1))
+        return [[self.categories[i] for i in row[:n]] for row, n in zip(top_k, lengths)]
@@ -1,23 +1,49 @@
 """Text classification using IBM Watsonx AI"""
-from ibm_watsonx_ai.credentials import Credentials
-from ibm_watsonx_ai import APIClient
-from ibm_watsonx_ai.foundation_models import ModelInference
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
+import asyncio
 import ast
+import functools
+import re
+from .llm_cache import LLMResultCache
+from .llm_scheduler import INTERACTIVE, LLMScheduler
+from .metrics import LLM_CALLS, LLM_ERRORS, MULTI_ITEM_FALLBACKS, PARSE_FAILURES, PROMPT_TOKENS, stage
+from .example_selector import estimate_tokens
+
+
+# One answer line of a multi-page prompt, e.g. "2: ['Sports', 'Football']"
+_MULTI_ANSWER = re.compile(r"^\s*(?:ITEM\s*)?(\d+)\s*[:.)-]\s*(\[.*)$", re.IGNORECASE)
 
 
 class TextClassifier:
     """Classify text using IBM Watsonx AI LLM"""
     
+    # Bump whenever build_prompt changes so cached results are not reused
+    PROMPT_VERSION = "1"
+    
     def __init__(
         self, 
         api_key: str, 
         project_id: str,
         url: str = "https://us-south.ml.cloud.ibm.com",
-        model_id: str = "mistralai/mistral-small-3-1-24b-instruct-2503"
+        model_id: str = "mistralai/mistral-small-3-1-24b-instruct-2503",
+        cache: Optional[LLMResultCache] = None,
+        model=None,
+        scheduler: Optional[LLMScheduler] = None
     ):
-        credentials = Credentials(url=url, api_key=api_key)
+        """
+        Initialize the classifier
         
+        Args:
+            api_key: IBM Watsonx AI API key
+            project_id: IBM Watsonx AI project ID
+            url: Watsonx endpoint URL
+            model_id: Foundation model ID
+            cache: Optional cache of LLM results
+            model: Prebuilt model exposing generate_text (e.g. a local stand-in
+                for benchmarks); when given, no Watsonx connection is made
+            scheduler: Optional scheduler that rate limits, retries and
+                prioritizes the Watsonx calls
+        """
         parameters = {
             "decoding_method": "sample",
             "temperature": 0.1,
@@ -26,23 +52,37 @@ class TextClassifier:
             "repetition_penalty": 1,
             "stop_sequences": ["]"]
         }
+        self.model_id = model_id
+        self.parameters = parameters
+        self.cache = cache
+        self.scheduler = scheduler
         
-        self.model = ModelInference(
-            model_id=model_id,
-            params=parameters,
-            credentials=credentials,
-            project_id=project_id
-        )
+        if model is not None:
+            self.model = model
+        else:
+            # Imported here so the app can start serving health checks before the SDK is loaded
+            from ibm_watsonx_ai.credentials import Credentials
+            from ibm_watsonx_ai.foundation_models import ModelInference
+            
+            # Keep a persistent, pooled HTTP connection to Watsonx across calls
+            credentials = Credentials(url=url, api_key=api_key)
+            self.model = ModelInference(
+                model_id=model_id,
+                params=parameters,
+                credentials=credentials,
+                project_id=project_id,
+                persistent_connection=True
+            )
     
-    def predict_categories(
+    def build_prompt(
         self, 
         url: str, 
         text: str, 
         top_k_categories: List[str],
         examples: str
-    ) -> List[str]:
-        """Predict categories for given text"""
-        prompt = f"""You are a researcher tasked with looking at a webpage url and deciding which category or 
+    ) -> str:
+        """Build the classification prompt for a single page"""
+        return f"""You are a researcher tasked with looking at a webpage url and deciding which category or 
     categories the webpage should be assigned based on provided url and text. The webpage can be assigned a minimum
     of 1 category and a maximum of 7 categories, but the average is 2.5 and the mode is 2.
     Make your selections ONLY from the following categories. Do not make up other categories, if the webpage url 
@@ -60,9 +100,271 @@ class TextClassifier:
         {text}
         
         categories:"""
+    
+    def build_multi_prompt(
+        self,
+        items: List[Tuple[str, str, List[str]]],
+        examples: str
+    ) -> str:
+        """Build one prompt classifying several pages, each with its own candidate list"""
+        blocks = []
+        for number, (url, text, top_k_categories) in enumerate(items, start=1):
+            blocks.append(f"""ITEM {number}
+        url:
+        {url}
+        
+        allowed categories:
+        {top_k_categories}
+        
+        content: 
+        {text}""")
+        pages = "\n        \n        ".join(blocks)
+        answer_format = "\n        ".join(
+            f"{number}: ['category', ...]" for number in range(1, len(items) + 1)
+        )
+        return f"""You are a researcher tasked with looking at several webpage urls and deciding which category or 
+    categories each webpage should be assigned based on its provided url and text. Each webpage can be assigned a
+    minimum of 1 category and a maximum of 7 categories, but the average is 2.5 and the mode is 2.
+    For each webpage, make your selections ONLY from that webpage's own allowed categories. Do not make up other 
+    categories, if the webpage url and content do not fit a clear category, just pick the closest option from its 
+    allowed categories.
+        
+        EXAMPLES:
+        {examples}
+        
+        INPUTS TO CATEGORIZE:
+        {pages}
+        
+        Answer with exactly one line per item, in order, as the item number, a colon and a list of categories:
+        {answer_format}
+        
+        answers:"""
+    
+    def _cache_key(
+        self, 
+        url: str, 
+        text: str, 
+        top_k_categories: List[str],
+        examples: str,
+        multi: bool = False
+    ) -> str:
+        """
+        Cache key for an LLM call, over normalized inputs and generation settings
+
+        Answers from a multi-page prompt (multi=True) are produced by another
+        prompt and settings, so they are keyed apart from single-page answers.
+        """
+        parts = dict(
+            url=url.strip(),
+            text=' '.join(text.split()),
+            candidates=list(top_k_categories),
+            examples=examples,
+            model_id=self.model_id,
+            params=self.parameters,
+            prompt_version=self.PROMPT_VERSION
+        )
+        if multi:
+            parts.update(mode="multi", params=self._multi_parameters(1))
+        return LLMResultCache.make_key(**parts)
+    
+    def _multi_parameters(self, n_items: int) -> dict:
+        """Generation settings of a multi-page prompt: no "]" stop sequence, and room for one answer line per item"""
+        return {
+            **self.parameters,
+            "stop_sequences": [],
+            "max_new_tokens": self.parameters["max_new_tokens"] * n_items
+        }
+    
+    def predict_categories(
+        self, 
+        url: str, 
+        text: str, 
+        top_k_categories: List[str],
+        examples: str,
+        lane: str = INTERACTIVE
+    ) -> List[str]:
+        """Predict categories for given text (lane is the scheduler priority lane)"""
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(url, text, top_k_categories, examples)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        prompt = self.build_prompt(url, text, top_k_categories, examples)
+        PROMPT_TOKENS.observe(estimate_tokens(prompt))
+        LLM_CALLS.inc(mode="single")
+        try:
+            with stage("llm"):
+                result = self._generate(lane, prompt=prompt)
+        except Exception:
+            LLM_ERRORS.inc()
+            raise
+        with stage("parse"):
+            categories = self._parse_result(result)
+        return self._store(key, categories)
+    
+    def predict_categories_multi(
+        self,
+        items: List[Tuple[str, str, List[str]]],
+        examples: str,
+        lane: str = INTERACTIVE
+    ) -> List[Union[List[str], Exception]]:
+        """
+        Predict categories for several pages with one LLM call
+        
+        The instructions and examples are sent once for all pages. Any item
+        whose answer is missing or cannot be parsed falls back to a single
+        predict_categories call. If the multi-page call itself fails (e.g. a
+        timeout or an open circuit), its error is returned for every item
+        not answered from the cache, without further calls.
+        
+        Args:
+            items: (url, text, top_k_categories) per page
+            examples: Examples string shared by all pages
+            lane: Scheduler priority lane of the calls
+            
+        Returns:
+            Categories per item, in input order. If the multi-page call or an
+            item's fallback call raises, the exception is returned in its place.
+        """
+        results: List[Optional[Union[List[str], Exception]]] = [None] * len(items)
+        keys: List[Optional[str]] = [None] * len(items)
+        if self.cache is not None:
+            for i, (url, text, top_k_categories) in enumerate(items):
+                # A single-page answer is as good as a multi-page one, but not the reverse
+                results[i] = self.cache.get(self._cache_key(url, text, top_k_categories, examples))
+                keys[i] = self._cache_key(url, text, top_k_categories, examples, multi=True)
+                if results[i] is None:
+                    results[i] = self.cache.get(keys[i])
+        
+        pending = [i for i, result in enumerate(results) if result is None]
+        if len(pending) > 1:
+            prompt = self.build_multi_prompt([items[i] for i in pending], examples)
+            PROMPT_TOKENS.observe(estimate_tokens(prompt))
+            LLM_CALLS.inc(mode="multi")
+            try:
+                with stage("llm_multi"):
+                    result = self._generate(lane, prompt=prompt, params=self._multi_parameters(len(pending)))
+            except Exception as e:
+                # Single calls would most likely fail the same way (after the scheduler's
+                # retries, if any), so report the error instead of multiplying the load
+                LLM_ERRORS.inc()
+                for i in pending:
+                    results[i] = e
+                return results
+            with stage("parse"):
+                answers = self._parse_multi_result(result, len(pending))
+            for i, categories in zip(pending, answers):
+                if categories:
+                    results[i] = self._store(keys[i], categories)
+        
+        # Fall back to single-page calls for anything still unanswered
+        for i, result in enumerate(results):
+            if result is None:
+                if len(pending) > 1:
+                    MULTI_ITEM_FALLBACKS.inc()
+                url, text, top_k_categories = items[i]
+                try:
+                    results[i] = self.predict_categories(url, text, top_k_categories, examples, lane=lane)
+                except Exception as e:
+                    results[i] = e
+        return results
+    
+    async def apredict_categories(
+        self, 
+        url: str, 
+        text: str, 
+        top_k_categories: List[str],
+        examples: str
+    ) -> List[str]:
+        """Predict categories for given text without blocking the event loop"""
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(url, text, top_k_categories, examples)
+            cached = await self._run_cache_op(self.cache.get, key)
+            if cached is not None:
+                return cached
+        
+        prompt = self.build_prompt(url, text, top_k_categories, examples)
+        PROMPT_TOKENS.observe(estimate_tokens(prompt))
+        LLM_CALLS.inc(mode="single")
+        try:
+            with stage("llm"):
+                if self.scheduler is not None:
+                    # The default (LLM_SCHEDULER=true): the blocking call runs on the
+                    # scheduler's threads, which enforce priority, rate limit and retries
+                    result = await self.scheduler.asubmit(
+                        functools.partial(self.model.generate_text, prompt=prompt, guardrails=False),
+                        INTERACTIVE
+                    )
+                elif hasattr(self.model, "agenerate"):
+                    # Only without the scheduler (LLM_SCHEDULER=false)
+                    response = await self.model.agenerate(prompt=prompt, guardrails=False)
+                    result = response["results"][0]["generated_text"]
+                else:
+                    # Older SDKs have no async API; run the blocking call in a thread
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(
+                        None,
+                        lambda: self.model.generate_text(prompt=prompt, guardrails=False)
+                    )
+        except Exception:
+            LLM_ERRORS.inc()
+            raise
+        with stage("parse"):
+            categories = self._parse_result(result)
+        return await self._run_cache_op(self._store, key, categories)
+    
+    async def _run_cache_op(self, fn, *args):
+        """Run a cache lookup or store, in a thread when it touches the on-disk cache"""
+        if self.cache is None or not self.cache.persistent:
+            return fn(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, fn, *args)
+    
+    def _generate(self, lane: str, **kwargs) -> str:
+        """Call generate_text, through the scheduler when there is one"""
+        call = functools.partial(self.model.generate_text, guardrails=False, **kwargs)
+        if self.scheduler is None:
+            return call()
+        return self.scheduler.submit(call, lane).result()
+    
+    def _store(self, key: Optional[str], categories: List[str]) -> List[str]:
+        """Cache a parsed result; empty results are treated as failures and not cached"""
+        if key is not None and categories:
+            self.cache.set(key, categories)
+        return categories
+    
+    def _parse_multi_result(self, result: str, n_items: int) -> List[Optional[List[str]]]:
+        """Parse a multi-page answer into categories per item (None where missing or invalid)"""
+        answers: List[Optional[List[str]]] = [None] * n_items
+        if not isinstance(result, str):
+            PARSE_FAILURES.inc()
+            return answers
+        
+        for line in result.splitlines():
+            match = _MULTI_ANSWER.match(line)
+            if not match:
+                continue
+            number = int(match.group(1))
+            if not 1 <= number <= n_items or answers[number - 1] is not None:
+                continue
+            body = match.group(2).strip()
+            if not body.endswith(']'):
+                body += ']'
+            try:
+                parsed = ast.literal_eval(body)
+            except (SyntaxError, ValueError, TypeError, MemoryError, RecursionError):
+                # e.g. "[{[1]: 2}]" raises TypeError; the item falls back to a single call
+                continue
+            if isinstance(parsed, list):
+                answers[number - 1] = parsed
         
-        result = self.model.generate_text(prompt=prompt, guardrails=False)
-        return self._parse_result(result)
+        missing = sum(answer is None for answer in answers)
+        if missing:
+            PARSE_FAILURES.inc(missing)
+        return answers
     
     def _parse_result(self, result: str) -> List[str]:
         """Parse LLM result to list of categories"""
@@ -72,6 +374,10 @@ class TextClassifier:
                 result += ']'
             try:
                 return ast.literal_eval(result)
-            except (SyntaxError, ValueError):
+            except (SyntaxError, ValueError, TypeError, MemoryError, RecursionError):
+                PARSE_FAILURES.inc()
                 return []
-        return result if isinstance(result, list) else []
\ No newline at end of file
+        if isinstance(result, list):
+            return result
+        PARSE_FAILURES.inc()
+        return []
\ No newline at end of file
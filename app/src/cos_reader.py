@@ -1,9 +1,11 @@
 """IBM Cloud Object Storage file reader utility"""
-import types
-import pandas as pd
-from typing import Optional
-from botocore.client import Config
-import ibm_boto3
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
 
 
 class COSReader:
@@ -13,7 +15,11 @@ class COSReader:
         self,
         api_key: str,
         endpoint_url: str,
-        auth_endpoint: str = "https://iam.cloud.ibm.com/identity/token"
+        auth_endpoint: str = "https://iam.cloud.ibm.com/identity/token",
+        cache_dir: Optional[str] = None,
+        max_workers: int = 8,
+        part_size: int = 32 * 1024 * 1024,
+        multipart_threshold: int = 64 * 1024 * 1024
     ):
         """
         Initialize COS client
@@ -22,7 +28,21 @@ class COSReader:
             api_key: IBM Cloud API key
             endpoint_url: COS endpoint URL
             auth_endpoint: IAM authentication endpoint
+            cache_dir: Local directory for downloaded objects (defaults to a
+                directory under the system temp dir)
+            max_workers: Parallel ranged GETs for large objects
+            part_size: Bytes per ranged GET
+            multipart_threshold: Objects at least this large are downloaded in parallel parts
         """
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "cos-cache")
+        self.max_workers = max_workers
+        self.part_size = part_size
+        self.multipart_threshold = multipart_threshold
+
+        # Imported here so the app starts without loading the COS SDK when COS is not used
+        from botocore.client import Config
+        import ibm_boto3
+
         self.cos_client = ibm_boto3.client(
             service_name='s3',
             ibm_api_key_id=api_key,
@@ -31,29 +51,90 @@ class COSReader:
             endpoint_url=endpoint_url
         )
     
-    def read_csv(self, bucket: str, object_key: str) -> pd.DataFrame:
+    def head(self, bucket: str, object_key: str) -> Dict:
         """
-        Read CSV file from COS bucket
+        Get object metadata without downloading it
         
         Args:
             bucket: COS bucket name
             object_key: Object key/path in the bucket
             
         Returns:
-            DataFrame with the CSV data
+            HEAD response with at least 'ETag' and 'ContentLength'
+        """
+        return self.cos_client.head_object(Bucket=bucket, Key=object_key)
+    
+    def _cache_path(self, bucket: str, object_key: str, etag: str) -> str:
+        """Local path of a cached object version"""
+        object_dir = hashlib.sha256(f"{bucket}/{object_key}".encode("utf-8")).hexdigest()
+        version = re.sub(r"[^A-Za-z0-9_-]", "", etag) or "unknown"
+        return os.path.join(self.cache_dir, object_dir, version, os.path.basename(object_key))
+    
+    def download(self, bucket: str, object_key: str) -> str:
         """
-        # Get object from COS
-        body = self.cos_client.get_object(Bucket=bucket, Key=object_key)['Body']
+        Download an object into the local cache, skipping unchanged objects
+        
+        A HEAD request compares the object's ETag with the cached copy, so an
+        unchanged object is not downloaded again. Large objects are fetched
+        with parallel ranged GETs. Older cached versions are removed.
+        
+        Args:
+            bucket: COS bucket name
+            object_key: Object key/path in the bucket
+            
+        Returns:
+            Local path of the downloaded object
+        """
+        metadata = self.head(bucket, object_key)
+        etag = metadata.get("ETag", "").strip('"')
+        size = int(metadata.get("ContentLength", 0))
+        path = self._cache_path(bucket, object_key, etag)
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            return path
+        
+        version_dir = os.path.dirname(path)
+        object_dir = os.path.dirname(version_dir)
+        os.makedirs(version_dir, exist_ok=True)
+        partial = f"{path}.part-{os.getpid()}"
+        try:
+            if size >= self.multipart_threshold and self.max_workers > 1:
+                self._download_ranges(bucket, object_key, etag, size, partial)
+            else:
+                body = self.cos_client.get_object(Bucket=bucket, Key=object_key)['Body']
+                with open(partial, "wb") as f:
+                    shutil.copyfileobj(body, f, length=1024 * 1024)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        
+        # Drop cached copies of older versions of this object
+        for entry in os.listdir(object_dir):
+            if entry != os.path.basename(version_dir):
+                shutil.rmtree(os.path.join(object_dir, entry), ignore_errors=True)
+        return path
+    
+    def _download_ranges(self, bucket: str, object_key: str, etag: str, size: int, path: str):
+        """Download an object with parallel ranged GETs into a preallocated file"""
+        with open(path, "wb") as f:
+            f.truncate(size)
         
-        # Add missing __iter__ method for pandas compatibility
-        if not hasattr(body, "__iter__"):
-            def __iter__(self):
-                return 0
-            body.__iter__ = types.MethodType(__iter__, body)
+        def fetch(start: int):
+            end = min(start + self.part_size, size) - 1
+            # IfMatch fails the download if the object changes between parts
+            conditions = {"IfMatch": f'"{etag}"'} if etag else {}
+            body = self.cos_client.get_object(
+                Bucket=bucket,
+                Key=object_key,
+                Range=f"bytes={start}-{end}",
+                **conditions
+            )['Body']
+            with open(path, "r+b") as f:
+                f.seek(start)
+                shutil.copyfileobj(body, f, length=1024 * 1024)
         
-        # Read CSV
-        df = pd.read_csv(body)
-        return df
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(fetch, range(0, size, self.part_size)))
     
     def file_exists(self, bucket: str, object_key: str) -> bool:
         """
@@ -67,7 +148,7 @@ class COSReader:
             True if file exists, False otherwise
         """
         try:
-            self.cos_client.head_object(Bucket=bucket, Key=object_key)
+            self.head(bucket, object_key)
             return True
         except Exception:
             return False
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""On-disk embedding artifacts keyed by dataset content and model"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from typing import Iterable, Optional, Tuple
+
+
+class EmbeddingStore:
+    """Persist text and category embeddings and load them back memory-mapped"""
+
+    MANIFEST = "manifest.json"
+    TEXT_FILE = "text_embeddings.npy"
+    CATEGORY_FILE = "category_embeddings.npy"
+
+    def __init__(self, cache_dir: str):
+        """
+        Initialize the store
+
+        Args:
+            cache_dir: Directory holding one sub-directory per artifact key
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def compute_key(
+        model_name: str,
+        texts: Iterable[str],
+        categories: Iterable[str],
+        max_words: int
+    ) -> str:
+        """
+        Compute the artifact key for a dataset
+
+        Args:
+            model_name: Embedding model name
+            texts: Training texts, after truncation
+            categories: Unique category names
+            max_words: Word truncation applied to texts
+
+        Returns:
+            Hex digest identifying the dataset content, model and truncation rules
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps({"model": model_name, "max_words": max_words}).encode())
+        for text in texts:
+            digest.update(b"\x00t")
+            digest.update(str(text).encode("utf-8"))
+        for category in categories:
+            digest.update(b"\x00c")
+            digest.update(str(category).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Load embeddings for a key
+
+        Args:
+            key: Artifact key from compute_key
+
+        Returns:
+            (text_embeddings, category_embeddings) as read-only memory maps,
+            or None if no complete artifact exists for the key
+        """
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, self.MANIFEST)) as f:
+                manifest = json.load(f)
+            text_embeddings = np.load(os.path.join(path, self.TEXT_FILE), mmap_mode="r")
+            category_embeddings = np.load(os.path.join(path, self.CATEGORY_FILE), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+        if (
+            manifest.get("key") != key
+            or text_embeddings.shape[0] != manifest.get("n_texts")
+            or category_embeddings.shape[0] != manifest.get("n_categories")
+        ):
+            return None
+        return text_embeddings, category_embeddings
+
+    def save(
+        self,
+        key: str,
+        text_embeddings: np.ndarray,
+        category_embeddings: np.ndarray,
+        **metadata
+    ) -> str:
+        """
+        Save embeddings for a key
+
+        The artifact is written to a temporary directory and renamed into
+        place, so concurrent readers never observe a partial artifact.
+
+        Args:
+            key: Artifact key from compute_key
+            text_embeddings: Training text embeddings
+            category_embeddings: Category embeddings
+            **metadata: Extra fields recorded in the manifest
+
+        Returns:
+            Path of the artifact directory
+        """
+        path = self._path(key)
+        tmp_path = tempfile.mkdtemp(prefix=f".{key}.", dir=self.cache_dir)
+        try:
+            np.save(os.path.join(tmp_path, self.TEXT_FILE), np.asarray(text_embeddings, dtype=np.float32))
+            np.save(os.path.join(tmp_path, self.CATEGORY_FILE), np.asarray(category_embeddings, dtype=np.float32))
+            manifest = {
+                "key": key,
+                "n_texts": int(len(text_embeddings)),
+                "n_categories": int(len(category_embeddings)),
+                "dim": int(np.shape(text_embeddings)[1]) if len(text_embeddings) else 0,
+                "created_at": time.time(),
+                **metadata
+            }
+            with open(os.path.join(tmp_path, self.MANIFEST), "w") as f:
+                json.dump(manifest, f, indent=2)
+
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+        return path
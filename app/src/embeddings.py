@@ -1,15 +1,81 @@
 """Embedding generation module"""
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List
+from typing import List, Optional
+
+# Embedding backends: float32 PyTorch (reference), PyTorch with dynamic int8
+# quantization of linear layers, ONNX Runtime, and ONNX Runtime with an int8 model
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+# Quantized ONNX export shipped with all-MiniLM-L6-v2; AVX2 runs on any recent x86 CPU
+DEFAULT_ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
 
 
 class EmbeddingGenerator:
     """Generate embeddings using SentenceTransformer"""
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        batch_size: int = 64,
+        backend: str = "torch",
+        num_threads: Optional[int] = None,
+        onnx_file: Optional[str] = None
+    ):
+        """
+        Initialize the generator
+        
+        Args:
+            model_name: SentenceTransformer model name
+            batch_size: Texts encoded per forward pass
+            backend: One of BACKENDS
+            num_threads: CPU threads used for encoding (None keeps the library default)
+            onnx_file: ONNX file in the model repository for the onnx backends
+                (defaults to the exported float model, or DEFAULT_ONNX_INT8_FILE for onnx-int8)
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of: {', '.join(BACKENDS)}")
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.backend = backend
+        self.num_threads = num_threads
+        
+        # Imported here so the app can start serving health checks before torch is loaded
+        from sentence_transformers import SentenceTransformer
+        
+        if backend.startswith("onnx"):
+            if backend == "onnx-int8":
+                onnx_file = onnx_file or DEFAULT_ONNX_INT8_FILE
+            model_kwargs = {"provider": "CPUExecutionProvider"}
+            if onnx_file:
+                model_kwargs["file_name"] = onnx_file
+            if num_threads:
+                import onnxruntime
+                session_options = onnxruntime.SessionOptions()
+                session_options.intra_op_num_threads = num_threads
+                model_kwargs["session_options"] = session_options
+            self.model = SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+        else:
+            import torch
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            self.model = SentenceTransformer(model_name)
+            if backend == "torch-int8":
+                self.model = torch.quantization.quantize_dynamic(
+                    self.model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+        
+        # Embeddings differ slightly between backends, so cached artifacts are keyed by both
+        self.model_id = model_name if backend == "torch" else f"{model_name}@{backend}"
     
-    def encode(self, texts: List[str], normalize: bool = True) -> np.ndarray:
+    def encode(
+        self,
+        texts: List[str],
+        normalize: bool = True,
+        batch_size: Optional[int] = None
+    ) -> np.ndarray:
         """Encode texts to embeddings"""
-        return self.model.encode(texts, normalize_embeddings=normalize)
+        return self.model.encode(
+            texts,
+            batch_size=batch_size or self.batch_size,
+            normalize_embeddings=normalize
+        )
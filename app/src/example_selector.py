@@ -0,0 +1,97 @@
+"""Retrieval of few-shot prompt examples from labeled training data"""
+import math
+import numpy as np
+from typing import List, Sequence
+from .vectors import as_embedding_matrix, similarities
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count for English text (about 4 tokens per 3 words)"""
+    return math.ceil(len(text.split()) * 4 / 3)
+
+
+class ExampleSelector:
+    """Select the labeled training rows most similar to a text as prompt examples"""
+
+    def __init__(
+        self,
+        embeddings,
+        urls: Sequence[str],
+        texts: Sequence[str],
+        categories: Sequence[List[str]],
+        max_examples: int = 5,
+        token_budget: int = 1500,
+        max_words_per_example: int = 120,
+        candidate_pool: int = 20
+    ):
+        """
+        Initialize the selector
+
+        Args:
+            embeddings: Normalized training text embeddings (float32 or float16), one row per training example
+            urls: Training URLs
+            texts: Training texts
+            categories: Training categories
+            max_examples: Maximum number of examples per prompt
+            token_budget: Maximum estimated tokens for all examples together
+            max_words_per_example: Words kept from each example's page content
+            candidate_pool: Nearest neighbors considered before applying the budget
+        """
+        self.embeddings = as_embedding_matrix(embeddings)
+        self.max_examples = max_examples
+        self.token_budget = token_budget
+        self.max_words_per_example = max_words_per_example
+        self.candidate_pool = max(candidate_pool, max_examples)
+
+        # Pre-render each example once, with its text already truncated
+        self.example_strings = [
+            self._format(url, text, cats)
+            for url, text, cats in zip(urls, texts, categories)
+        ]
+        self.example_tokens = np.array(
+            [estimate_tokens(s) for s in self.example_strings], dtype=np.int32
+        )
+
+    def _format(self, url: str, text: str, categories: List[str]) -> str:
+        text = ' '.join(str(text).split()[:self.max_words_per_example])
+        return f"url:{url}, page content:{text}, Categories:{list(categories)}"
+
+    def _pack(self, neighbors: np.ndarray) -> str:
+        """Greedily add neighbors, nearest first, while they fit the budget"""
+        selected, used, seen = [], 0, set()
+        for i in neighbors:
+            example = self.example_strings[i]
+            if example in seen:
+                continue
+            tokens = int(self.example_tokens[i])
+            if used + tokens > self.token_budget:
+                continue
+            selected.append(example)
+            seen.add(example)
+            used += tokens
+            if len(selected) >= self.max_examples:
+                break
+        return "\n".join(selected)
+
+    def select(self, text_embedding) -> str:
+        """Build the examples string for one text embedding"""
+        return self.select_batch([text_embedding])[0]
+
+    def select_batch(self, text_embeddings) -> List[str]:
+        """Build the examples strings for many text embeddings at once"""
+        queries = np.asarray(text_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        n = self.embeddings.shape[0]
+        if n == 0:
+            return [""] * len(queries)
+
+        sims = similarities(queries, self.embeddings)
+        pool = min(self.candidate_pool, n)
+        if pool < n:
+            neighbors = np.argpartition(-sims, pool - 1, axis=1)[:, :pool]
+        else:
+            neighbors = np.broadcast_to(np.arange(n), sims.shape)
+        order = np.argsort(-np.take_along_axis(sims, neighbors, axis=1), axis=1, kind="stable")
+        neighbors = np.take_along_axis(neighbors, order, axis=1)
+        return [self._pack(row) for row in neighbors]
@@ -0,0 +1,135 @@
+"""Training data ingestion: safe label parsing and vectorized preparation"""
+import ast
+import json
+import re
+import numpy as np
+import pandas as pd
+from typing import Iterable, List, Optional, Union
+
+# A list literal of single-quoted strings without escapes, e.g. "['/a/b/c', '/d/e/f']"
+_SIMPLE_LIST = re.compile(r"^\[\s*(?:'[^'\\]*'\s*(?:,\s*'[^'\\]*'\s*)*,?\s*)?\]$")
+_QUOTED = re.compile(r"'([^'\\]*)'")
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+
+
+def parse_label_list(value) -> List[str]:
+    """
+    Parse a label cell into a list of strings without evaluating code
+
+    Handles Python list literals (the usual CSV form), JSON arrays and
+    values that are already sequences (e.g. from Parquet). Anything else
+    parses to an empty list.
+
+    Args:
+        value: Raw label cell
+
+    Returns:
+        List of label strings
+    """
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [str(v) for v in value]
+    if not isinstance(value, str):
+        return []
+
+    value = value.strip()
+    if _SIMPLE_LIST.match(value):
+        return _QUOTED.findall(value)
+    try:
+        parsed = json.loads(value)
+    except (ValueError, RecursionError):
+        try:
+            parsed = ast.literal_eval(value)
+        except (SyntaxError, ValueError, TypeError, MemoryError, RecursionError):
+            return []
+    if isinstance(parsed, (list, tuple)):
+        return [str(v) for v in parsed]
+    return []
+
+
+def truncate_words(texts: pd.Series, max_words: int) -> pd.Series:
+    """Keep the first max_words whitespace-separated words of each text; missing texts become empty"""
+    # astype(str) keeps NaN as a float under pandas 3, so convert each value explicitly
+    return texts.fillna('').map(str).str.split(n=max_words).str[:max_words].str.join(' ')
+
+
+def prepare_training_data(df: pd.DataFrame, max_words: int = 500, level: Optional[int] = 3) -> pd.DataFrame:
+    """
+    Prepare raw training rows for the pipeline in one vectorized pass
+
+    Parses labels, truncates texts, replaces underscores with spaces,
+    extracts the category at the given path level (or normalizes the full
+    path), removes duplicate categories per row and drops rows without
+    categories.
+
+    Args:
+        df: Raw rows with 'url', 'text' and 'label' columns
+        max_words: Words kept from each text
+        level: Label path level used as the category (1-based), None to use
+            the full path, e.g. '/Arts & Entertainment/Music/Jazz'
+
+    Returns:
+        DataFrame with 'label', 'text', 'categories' and 'categories_count' columns
+    """
+    df = df.reset_index(drop=True)
+    labels = df['label'].map(parse_label_list)
+
+    # One row per (training row, label)
+    exploded = labels.explode().dropna().astype(str).str.replace("_", " ", regex=False)
+    if level is None:
+        paths = exploded.str.replace(r'/+', '/', regex=True).str.strip('/')
+        categories = '/' + paths[paths != '']
+    else:
+        parts = exploded.str.strip('/').str.split('/')
+        categories = parts[parts.str.len() >= level].str[level - 1]
+
+    # Remove duplicates within each row, keeping first occurrence order
+    pairs = categories.rename('category').reset_index().drop_duplicates()
+    grouped = pairs.groupby('index', sort=False)['category'].agg(list)
+
+    df = df.loc[grouped.index].copy()
+    df['label'] = exploded.groupby(level=0, sort=False).agg(list).reindex(df.index)
+    df['text'] = truncate_words(df['text'], max_words)
+    df['categories'] = grouped
+    df['categories_count'] = df['categories'].str.len()
+    return df.sort_index()
+
+
+def read_training_data(
+    source: Union[str, pd.DataFrame, Iterable[pd.DataFrame]],
+    max_words: int = 500,
+    chunksize: Optional[int] = None,
+    level: Optional[int] = 3
+) -> pd.DataFrame:
+    """
+    Read and prepare training data from a file or DataFrame(s)
+
+    Parquet files are read directly. CSV files are read whole, or in
+    chunks of chunksize rows that are prepared one at a time, so raw
+    untruncated text is never held for the whole file.
+
+    Args:
+        source: CSV or Parquet path, a DataFrame, or an iterable of DataFrame chunks
+        max_words: Words kept from each text
+        chunksize: Rows per CSV chunk, None to read the file at once
+        level: Label path level used as the category (1-based), None for the full path
+
+    Returns:
+        Prepared training DataFrame
+    """
+    if isinstance(source, pd.DataFrame):
+        return prepare_training_data(source, max_words, level)
+
+    if isinstance(source, str):
+        if source.lower().endswith(PARQUET_EXTENSIONS):
+            return prepare_training_data(pd.read_parquet(source), max_words, level)
+        if not chunksize:
+            return prepare_training_data(pd.read_csv(source), max_words, level)
+        source = pd.read_csv(source, chunksize=chunksize)
+
+    prepared = [prepare_training_data(chunk, max_words, level) for chunk in source]
+    if not prepared:
+        return prepare_training_data(
+            pd.DataFrame(columns=['url', 'text', 'label']), max_words, level
+        )
+    return pd.concat(prepared, ignore_index=True)
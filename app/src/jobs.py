@@ -0,0 +1,330 @@
+"""Asynchronous batch classification jobs with on-disk checkpoints"""
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import pandas as pd
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterator, List, Optional
+from .batch_io import BatchResultWriter, detect_encoding, iter_csv_chunks
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+ACTIVE = (QUEUED, RUNNING)
+
+
+class BatchJobManager:
+    """
+    Classify uploaded CSV files in the background, checkpointing results per chunk
+
+    Each job has its own directory holding the uploaded CSV, a status file and
+    one checkpoint file per classified chunk. A chunk with a checkpoint is
+    never classified again, so a job interrupted by a crash or restart
+    resumes from its last checkpoint. A per-job file lock ensures that only
+    one process works on a job when several workers share the directory.
+    """
+
+    STATUS_FILE = "status.json"
+    INPUT_FILE = "input.csv"
+    CANCEL_FILE = "cancel"
+    LOCK_FILE = ".lock"
+    CHUNKS_DIR = "chunks"
+
+    def __init__(
+        self,
+        pipeline,
+        directory: str,
+        chunk_rows: int = 500,
+        max_jobs: int = 1,
+        max_concurrency: int = 8
+    ):
+        """
+        Initialize the manager
+
+        Args:
+            pipeline: ClassificationPipeline used for classification
+            directory: Directory holding one sub-directory per job
+            chunk_rows: Rows classified and checkpointed together
+            max_jobs: Jobs processed at the same time by this process
+            max_concurrency: Maximum number of concurrent LLM calls per job
+        """
+        self.pipeline = pipeline
+        self.directory = directory
+        self.chunk_rows = max(1, chunk_rows)
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_jobs), thread_name_prefix="batch-job")
+        self._status_lock = threading.Lock()
+        # Status of completed and failed jobs, which never change, so stats() only reads active ones
+        self._finished: Dict[str, str] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str, *parts: str) -> str:
+        # Job ids are generated hex strings; anything else cannot name a job directory
+        if not job_id.isalnum():
+            raise KeyError(job_id)
+        return os.path.join(self.directory, job_id, *parts)
+
+    def _chunk_path(self, job_id: str, index: int) -> str:
+        return self._path(job_id, self.CHUNKS_DIR, f"{index:06d}.json")
+
+    @staticmethod
+    def _write_json(path: str, data) -> None:
+        """Write a JSON file atomically, so readers and restarts never see a partial file"""
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _read_status(self, job_id: str) -> Optional[Dict]:
+        try:
+            with open(self._path(job_id, self.STATUS_FILE)) as f:
+                return json.load(f)
+        except (KeyError, OSError, ValueError):
+            return None
+
+    def _write_status(self, status: Dict) -> None:
+        status["updated_at"] = time.time()
+        with self._status_lock:
+            self._write_json(self._path(status["id"], self.STATUS_FILE), status)
+
+    def submit(self, source: BinaryIO, filename: str, k: int = 55) -> Dict:
+        """
+        Store an uploaded CSV as a new job and queue it
+
+        Args:
+            source: Binary stream of the CSV file
+            filename: Original file name
+            k: Number of candidate categories per row
+
+        Returns:
+            The job status
+
+        Raises:
+            ValueError: If the file cannot be decoded, is empty or lacks url/text columns
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = self._path(job_id)
+        os.makedirs(os.path.join(job_dir, self.CHUNKS_DIR))
+        try:
+            input_path = os.path.join(job_dir, self.INPUT_FILE)
+            with open(input_path, "wb") as f:
+                shutil.copyfileobj(source, f, 1 << 20)
+            with open(input_path, "rb") as f:
+                encoding = detect_encoding(f)
+            if encoding is None:
+                raise ValueError("Unable to decode CSV file. Please ensure it's properly encoded.")
+            try:
+                columns = list(pd.read_csv(input_path, encoding=encoding, nrows=0).columns)
+            except pd.errors.EmptyDataError:
+                raise ValueError("Uploaded CSV file is empty")
+            except pd.errors.ParserError:
+                raise ValueError("Invalid CSV file format")
+            if 'url' not in columns or 'text' not in columns:
+                raise ValueError("CSV must contain 'url' and 'text' columns")
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        status = {
+            "id": job_id,
+            "status": QUEUED,
+            "filename": filename,
+            "k": k,
+            "encoding": encoding,
+            "columns": columns,
+            "chunk_rows": self.chunk_rows,
+            "total_rows": None,
+            "processed_rows": 0,
+            "failed_rows": 0,
+            "chunks_done": 0,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        }
+        self._write_status(status)
+        self._executor.submit(self._run, job_id)
+        return status
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Status and progress of a job, or None if it does not exist"""
+        status = self._read_status(job_id)
+        if status is not None:
+            total = status["total_rows"]
+            status["progress"] = status["processed_rows"] / total if total else (1.0 if status["status"] == COMPLETED else 0.0)
+        return status
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job and delete its files
+
+        A job being processed stops after its current chunk; the process
+        working on it removes the files then.
+
+        Returns:
+            False if the job does not exist
+        """
+        if self._read_status(job_id) is None:
+            return False
+        try:
+            lock = open(self._path(job_id, self.LOCK_FILE), "a")
+        except FileNotFoundError:
+            # Removed by a concurrent cancel
+            return False
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Being processed (possibly by another worker process)
+                try:
+                    open(self._path(job_id, self.CANCEL_FILE), "w").close()
+                except FileNotFoundError:
+                    return False
+                return True
+            shutil.rmtree(self._path(job_id), ignore_errors=True)
+        return True
+
+    def resume(self) -> List[str]:
+        """Queue every job that was queued or running when the service stopped"""
+        resumed = []
+        for job_id in sorted(os.listdir(self.directory)):
+            status = self._read_status(job_id)
+            if status is not None and status["status"] in ACTIVE:
+                self._executor.submit(self._run, job_id)
+                resumed.append(job_id)
+        return resumed
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Number of jobs by status
+
+        Only the status files of queued and running jobs are read; finished
+        jobs are counted from memory. Jobs of other worker processes sharing
+        the directory are included.
+        """
+        counts = {QUEUED: 0, RUNNING: 0, COMPLETED: 0, FAILED: 0}
+        job_ids = set(os.listdir(self.directory))
+        with self._status_lock:
+            for job_id in set(self._finished) - job_ids:
+                del self._finished[job_id]
+            finished = dict(self._finished)
+        for job_id in job_ids:
+            state = finished.get(job_id)
+            if state is None:
+                status = self._read_status(job_id)
+                if status is None:
+                    continue
+                state = status["status"]
+                if state not in ACTIVE:
+                    with self._status_lock:
+                        self._finished[job_id] = state
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    def iter_results(self, job_id: str, output_format: str = "csv") -> Iterator[str]:
+        """
+        Serialized output rows of a completed job, in input order
+
+        The input CSV is read again chunk by chunk and joined with the checkpoints.
+
+        Args:
+            job_id: Job ID
+            output_format: 'csv' or 'ndjson'
+
+        Returns:
+            Iterator over serialized output lines
+        """
+        status = self._read_status(job_id)
+        writer = BatchResultWriter(status["columns"], output_format)
+        header = writer.header()
+        if header:
+            yield header
+        with open(self._path(job_id, self.INPUT_FILE), "rb") as f, \
+                closing(iter_csv_chunks(f, status["encoding"], chunksize=status["chunk_rows"])) as chunks:
+            for index, chunk in enumerate(chunks):
+                with open(self._chunk_path(job_id, index)) as checkpoint:
+                    outcomes = json.load(checkpoint)["results"]
+                for values, (categories, error) in zip(chunk.itertuples(index=False, name=None), outcomes):
+                    yield writer.row(list(values), categories, error)
+
+    def _run(self, job_id: str):
+        """Process a job while holding its lock; another process already holding it keeps the job"""
+        try:
+            lock = open(self._path(job_id, self.LOCK_FILE), "a")
+        except (KeyError, OSError):
+            return
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            status = self._read_status(job_id)
+            if status is None or status["status"] not in ACTIVE:
+                return
+
+            status["status"] = RUNNING
+            status["started_at"] = status["started_at"] or time.time()
+            self._write_status(status)
+            try:
+                finished = self._process(status)
+            except Exception as e:
+                print(f"Batch job {job_id} failed: {e}")
+                status.update(status=FAILED, error=str(e), finished_at=time.time())
+                self._write_status(status)
+                return
+
+            if not finished:
+                print(f"Batch job {job_id} cancelled")
+                shutil.rmtree(self._path(job_id), ignore_errors=True)
+                return
+            status.update(status=COMPLETED, finished_at=time.time())
+            self._write_status(status)
+
+    def _process(self, status: Dict) -> bool:
+        """Classify every chunk without a checkpoint; returns False if the job was cancelled"""
+        job_id = status["id"]
+        input_path = self._path(job_id, self.INPUT_FILE)
+        if status["total_rows"] is None:
+            status["total_rows"] = sum(
+                len(chunk) for chunk in
+                pd.read_csv(input_path, encoding=status["encoding"], usecols=['url'], chunksize=100000)
+            )
+
+        # Progress is recounted from the checkpoints, which are written before the status
+        status.update(processed_rows=0, failed_rows=0, chunks_done=0)
+        with open(input_path, "rb") as f, \
+                closing(iter_csv_chunks(f, status["encoding"], chunksize=status["chunk_rows"])) as chunks:
+            for index, chunk in enumerate(chunks):
+                if os.path.exists(self._path(job_id, self.CANCEL_FILE)):
+                    return False
+
+                checkpoint = self._chunk_path(job_id, index)
+                if os.path.exists(checkpoint):
+                    with open(checkpoint) as c:
+                        outcomes = json.load(c)["results"]
+                else:
+                    outcomes = self.pipeline.classify_batch(
+                        urls=chunk['url'].astype(str).tolist(),
+                        texts=chunk['text'].astype(str).tolist(),
+                        k=status["k"],
+                        max_concurrency=self.max_concurrency
+                    )
+                    self._write_json(checkpoint, {"rows": len(chunk), "results": outcomes})
+
+                status["processed_rows"] += len(outcomes)
+                status["failed_rows"] += sum(error is not None for _, error in outcomes)
+                status["chunks_done"] += 1
+                self._write_status(status)
+        return True
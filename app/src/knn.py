@@ -0,0 +1,123 @@
+"""Embedding-only label prediction by weighted kNN voting"""
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+from .vectors import as_embedding_matrix, similarities
+
+
+class KNNLabelPredictor:
+    """Predict categories from the labels of the nearest training texts"""
+
+    def __init__(
+        self,
+        embeddings,
+        categories: Sequence[List[str]],
+        labels: Sequence[str],
+        n_neighbors: int = 15,
+        label_threshold: float = 0.5,
+        category_weight: float = 0.2,
+        max_labels: int = 7
+    ):
+        """
+        Initialize the predictor
+
+        Args:
+            embeddings: Normalized training text embeddings (float32 or float16)
+            categories: Categories of each training text
+            labels: All category names, in the column order of category similarity arrays
+            n_neighbors: Number of neighbors that vote
+            label_threshold: Minimum label score for a label to be predicted
+            category_weight: Weight of the text-to-category similarity in a label's score,
+                the remainder being its similarity-weighted vote share
+            max_labels: Maximum number of predicted labels
+        """
+        self.embeddings = as_embedding_matrix(embeddings)
+        self.n_neighbors = n_neighbors
+        self.label_threshold = label_threshold
+        self.category_weight = category_weight
+        self.max_labels = max_labels
+
+        # Sparse row -> label incidence as integer ids in CSR form: the labels
+        # of row i are label_ids[label_offsets[i]:label_offsets[i + 1]]
+        self.labels = list(labels)
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        rows = [sorted({label_index[cat] for cat in row if cat in label_index}) for row in categories]
+        self.label_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in rows], out=self.label_offsets[1:])
+        self.label_ids = np.fromiter(
+            (i for row in rows for i in row), dtype=np.int32, count=int(self.label_offsets[-1])
+        )
+
+    def predict(
+        self,
+        text_embedding,
+        category_similarities: Optional[np.ndarray] = None
+    ) -> Tuple[List[str], float]:
+        """Predict labels and a confidence for one text embedding"""
+        if category_similarities is not None:
+            category_similarities = np.asarray(category_similarities).reshape(1, -1)
+        return self.predict_batch([text_embedding], category_similarities)[0]
+
+    def predict_batch(
+        self,
+        text_embeddings,
+        category_similarities: Optional[np.ndarray] = None
+    ) -> List[Tuple[List[str], float]]:
+        """
+        Predict labels for many text embeddings
+
+        Each label's score is a blend of its similarity-weighted vote share
+        among the nearest neighbors and the text's similarity to the
+        category itself. Labels scoring at least label_threshold are
+        predicted (at least the best one). The confidence is the lowest
+        predicted label score scaled by the nearest neighbor's similarity,
+        so it is high only when a near-identical training page agrees.
+
+        Args:
+            text_embeddings: Normalized text embeddings
+            category_similarities: Cosine similarity of each text to each label,
+                shape (n_texts, n_labels); ignored when None
+
+        Returns:
+            One (labels, confidence) tuple per text embedding
+        """
+        queries = np.asarray(text_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        n = self.embeddings.shape[0]
+        if n == 0:
+            return [([], 0.0) for _ in range(len(queries))]
+
+        sims = similarities(queries, self.embeddings)
+        n_neighbors = min(self.n_neighbors, n)
+        neighbors = np.argpartition(-sims, n_neighbors - 1, axis=1)[:, :n_neighbors]
+
+        results = []
+        for row, idx in enumerate(neighbors):
+            weights = np.clip(sims[row, idx], 0.0, None)
+            total = float(weights.sum())
+            if total <= 0:
+                results.append(([], 0.0))
+                continue
+
+            votes = np.zeros(len(self.labels), dtype=np.float32)
+            for weight, i in zip(weights, idx):
+                votes[self.label_ids[self.label_offsets[i]:self.label_offsets[i + 1]]] += weight
+            votes /= total
+
+            voted = np.flatnonzero(votes)
+            if category_similarities is not None:
+                label_scores = (
+                    (1 - self.category_weight) * votes[voted]
+                    + self.category_weight * category_similarities[row, voted]
+                )
+            else:
+                label_scores = votes[voted]
+            scores = {self.labels[j]: float(score) for j, score in zip(voted, label_scores)}
+            ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+            selected = [item for item in ranked if item[1] >= self.label_threshold][:self.max_labels]
+            if not selected:
+                selected = ranked[:1]
+
+            confidence = min(score for _, score in selected) * float(weights.max())
+            results.append(([label for label, _ in selected], max(0.0, min(1.0, confidence))))
+        return results
@@ -0,0 +1,149 @@
+"""Cache of LLM classification results"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+class LLMResultCache:
+    """LRU cache with TTL for LLM results, optionally backed by SQLite"""
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl_seconds: Optional[float] = None,
+        db_path: Optional[str] = None
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            max_size: Maximum number of entries kept in memory and on disk
+            ttl_seconds: Entry lifetime in seconds, None for no expiry
+            db_path: SQLite file for a cache that survives restarts, None for memory only
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        self._db_writes = 0
+        # Access times of disk hits, written with the next insert instead of one commit per read
+        self._touched: Dict[str, float] = {}
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """Hash the parts of an LLM call into a cache key"""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @property
+    def persistent(self) -> bool:
+        """Whether entries are also stored on disk (get and set may block on I/O)"""
+        return self._db is not None
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl_seconds if self.ttl_seconds else None
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return the cached result for a key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return list(value)
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, expires_at = json.loads(row[0]), row[1]
+                    if expires_at is None or expires_at > now:
+                        self._touched[key] = now
+                        self._store(key, expires_at, value)
+                        self.hits += 1
+                        return list(value)
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def _store(self, key: str, expires_at: Optional[float], value: List[str]):
+        """Insert into the in-memory LRU (lock must be held)"""
+        self._entries[key] = (expires_at, tuple(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def set(self, key: str, value: List[str]):
+        """Store a result for a key"""
+        expires_at = self._expires_at()
+        with self._lock:
+            self._store(key, expires_at, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(list(value)), expires_at, time.time())
+                )
+                if self._touched:
+                    self._db.executemany(
+                        "UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                        [(accessed_at, touched) for touched, accessed_at in self._touched.items()]
+                    )
+                    self._touched.clear()
+                self._db_writes += 1
+                # Trim the on-disk cache to max_size every so often
+                if self._db_writes % 100 == 0:
+                    self._db.execute(
+                        "DELETE FROM llm_cache WHERE key IN ("
+                        "SELECT key FROM llm_cache ORDER BY accessed_at DESC "
+                        "LIMIT -1 OFFSET ?)",
+                        (self.max_size,)
+                    )
+                self._db.commit()
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._touched.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self._db is not None
+            }
@@ -0,0 +1,391 @@
+"""Rate-limited, prioritized dispatch of LLM calls"""
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Deque, Dict, Optional
+from .metrics import LLM_QUEUE_SECONDS, LLM_REJECTED, LLM_RETRIES, LLM_TIMEOUTS
+
+# Priority lanes, highest first
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)
+
+# HTTP statuses worth retrying: timeouts, throttling and server errors
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+_STATUS_IN_MESSAGE = re.compile(r"\b(408|425|429|500|502|503|504)\b|too many requests|rate limit", re.IGNORECASE)
+
+
+class LLMTimeoutError(TimeoutError):
+    """An LLM call did not finish within the scheduler's timeout"""
+
+
+class CircuitOpenError(RuntimeError):
+    """LLM calls are being rejected because recent calls kept failing"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM service unavailable, retry in {retry_after:.1f} s")
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an LLM call error is transient (timeout, throttling, server or connection error)"""
+    if isinstance(error, (LLMTimeoutError, CircuitOpenError, ConnectionError, TimeoutError)):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUSES
+    return bool(_STATUS_IN_MESSAGE.search(str(error)))
+
+
+class TokenBucket:
+    """Token bucket rate limiter; not thread-safe, callers hold their own lock"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        Initialize a full bucket
+
+        Args:
+            rate: Tokens added per second
+            burst: Bucket capacity, defaults to one second of tokens (at least 1)
+        """
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        """Consume one token"""
+        self._refill()
+        self.tokens -= 1
+
+
+class CircuitBreaker:
+    """Reject calls for a while after consecutive failures, then let one trial call through"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        """
+        Initialize a closed breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_seconds: Time the circuit stays open before a trial call is allowed
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at < self.reset_seconds:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a trial call through (0 if it is not open)"""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may be made now; in the half-open state only one trial call is allowed"""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    self.times_opened += 1
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class _Call:
+    """A submitted call and its retry state"""
+
+    __slots__ = ("fn", "lane", "future", "attempt", "submitted")
+
+    def __init__(self, fn: Callable[[], Any], lane: str):
+        self.fn = fn
+        self.lane = lane
+        self.future: Future = Future()
+        self.attempt = 0
+        self.submitted = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Dispatch blocking LLM calls through priority lanes, a rate limit and a circuit breaker
+
+    Worker threads always take interactive calls before batch calls, and batch
+    calls may only occupy max_batch_concurrent workers, so interactive
+    requests never queue behind a full batch. Each dispatch consumes a token
+    from the bucket. Transient failures (timeouts, throttling, server errors)
+    are retried with jittered exponential backoff; retries wait off the worker
+    threads and rejoin the front of their lane. While the circuit is open,
+    interactive calls fail immediately and batch calls back off until it
+    half-opens.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 32,
+        max_batch_concurrent: Optional[int] = None,
+        rate_per_second: Optional[float] = None,
+        burst: Optional[float] = None,
+        timeout_seconds: Optional[float] = 60.0,
+        max_retries: int = 3,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 20.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        max_abandoned: Optional[int] = None
+    ):
+        """
+        Initialize the scheduler and start its worker threads
+
+        Args:
+            max_concurrent: Maximum number of calls in progress
+            max_batch_concurrent: Maximum number of batch calls in progress,
+                defaults to three quarters of max_concurrent
+            rate_per_second: Calls started per second, None for no limit
+            burst: Calls that may start at once after an idle period, defaults to one second's worth
+            timeout_seconds: Time limit per attempt, None for no limit
+            max_retries: Retries of a transient failure before it is raised
+            backoff_base_seconds: Backoff cap of the first retry, doubled for each further one
+            backoff_max_seconds: Upper bound of the backoff cap
+            failure_threshold: Consecutive transient failures that open the circuit
+            reset_seconds: Time the circuit stays open before a trial call
+            max_abandoned: Maximum number of timed-out calls that may still be
+                running, defaults to max_concurrent. A blocking SDK call cannot be
+                interrupted, so a timed-out attempt keeps its thread until it
+                returns; while this many are hanging, no new calls start
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        if max_batch_concurrent is None:
+            max_batch_concurrent = self.max_concurrent * 3 // 4
+        self.max_batch_concurrent = min(self.max_concurrent, max(1, max_batch_concurrent))
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max(0, max_retries)
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.bucket = TokenBucket(rate_per_second, burst) if rate_per_second else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[_Call]] = {lane: deque() for lane in LANES}
+        self._running = {lane: 0 for lane in LANES}
+        self.max_abandoned = max(1, max_abandoned if max_abandoned is not None else self.max_concurrent)
+        self._abandoned = 0
+        self._counts = {"submitted": 0, "completed": 0, "failed": 0, "retries": 0, "timeouts": 0, "rejected": 0}
+
+        # Attempts run here so a worker can give up on one that exceeds the timeout.
+        # Threads: max_concurrent workers, plus max_concurrent attempts in progress and
+        # max_abandoned timed-out attempts still hanging, so an attempt never queues
+        self._attempts = ThreadPoolExecutor(
+            max_workers=self.max_concurrent + self.max_abandoned, thread_name_prefix="llm-call"
+        )
+        self._workers = [
+            threading.Thread(target=self._run, name=f"llm-scheduler-{i}", daemon=True)
+            for i in range(self.max_concurrent)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, fn: Callable[[], Any], lane: str = INTERACTIVE) -> Future:
+        """
+        Queue a call
+
+        Args:
+            fn: Blocking function making one LLM call
+            lane: INTERACTIVE or BATCH
+
+        Returns:
+            Future for the result of fn
+
+        Raises:
+            CircuitOpenError: For interactive calls while the circuit is open
+        """
+        if lane not in self._queues:
+            raise ValueError(f"lane must be one of: {', '.join(LANES)}")
+        if lane == INTERACTIVE and self.breaker.state == CircuitBreaker.OPEN:
+            LLM_REJECTED.inc(lane=lane)
+            with self._cond:
+                self._counts["rejected"] += 1
+            raise CircuitOpenError(self.breaker.retry_after())
+
+        call = _Call(fn, lane)
+        with self._cond:
+            self._counts["submitted"] += 1
+            self._queues[lane].append(call)
+            self._cond.notify()
+        return call.future
+
+    async def asubmit(self, fn: Callable[[], Any], lane: str = INTERACTIVE) -> Any:
+        """Queue a call and await its result; cancelling the caller drops a call that has not started"""
+        return await asyncio.wrap_future(self.submit(fn, lane))
+
+    def _eligible_lane(self) -> Optional[str]:
+        if self._abandoned >= self.max_abandoned:
+            return None
+        if self._queues[INTERACTIVE]:
+            return INTERACTIVE
+        if self._queues[BATCH] and self._running[BATCH] < self.max_batch_concurrent:
+            return BATCH
+        return None
+
+    def _next_call(self) -> _Call:
+        """Wait for the highest priority call that may start under the rate limit"""
+        with self._cond:
+            while True:
+                lane = self._eligible_lane()
+                if lane is None:
+                    self._cond.wait()
+                    continue
+                wait = self.bucket.wait_time() if self.bucket is not None else 0.0
+                if wait > 0:
+                    # Re-evaluated on wake-up, so a call arriving meanwhile in a higher lane goes first
+                    self._cond.wait(wait)
+                    continue
+                call = self._queues[lane].popleft()
+                if call.attempt == 0:
+                    if not call.future.set_running_or_notify_cancel():
+                        continue
+                    LLM_QUEUE_SECONDS.observe(time.monotonic() - call.submitted, lane=lane)
+                if self.bucket is not None:
+                    self.bucket.take()
+                self._running[lane] += 1
+                return call
+
+    def _run(self):
+        while True:
+            call = self._next_call()
+            try:
+                self._attempt(call)
+            finally:
+                with self._cond:
+                    self._running[call.lane] -= 1
+                    self._cond.notify()
+
+    def _attempt(self, call: _Call):
+        """Make one attempt of a call and resolve, retry or fail it"""
+        if not self.breaker.allow():
+            LLM_REJECTED.inc(lane=call.lane)
+            with self._cond:
+                self._counts["rejected"] += 1
+            self._retry_or_fail(call, CircuitOpenError(self.breaker.retry_after()))
+            return
+
+        attempt = self._attempts.submit(call.fn)
+        try:
+            result = attempt.result(timeout=self.timeout_seconds)
+        except FutureTimeoutError:
+            if not attempt.cancel():
+                # Still running: its thread stays busy until the call returns
+                with self._cond:
+                    self._abandoned += 1
+                attempt.add_done_callback(self._release_abandoned)
+            LLM_TIMEOUTS.inc()
+            with self._cond:
+                self._counts["timeouts"] += 1
+            error = LLMTimeoutError(f"LLM call timed out after {self.timeout_seconds} s")
+        except Exception as e:
+            error = e
+        else:
+            self.breaker.record_success()
+            with self._cond:
+                self._counts["completed"] += 1
+            call.future.set_result(result)
+            return
+
+        # Client errors mean the service answered, so only transient ones count against it
+        if is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        self._retry_or_fail(call, error)
+
+    def _release_abandoned(self, _attempt: Future):
+        with self._cond:
+            self._abandoned -= 1
+            self._cond.notify_all()
+
+    def _retry_or_fail(self, call: _Call, error: Exception):
+        retry = is_retryable(error) and call.attempt < self.max_retries
+        if isinstance(error, CircuitOpenError) and call.lane == INTERACTIVE:
+            retry = False
+        if not retry:
+            with self._cond:
+                self._counts["failed"] += 1
+            call.future.set_exception(error)
+            return
+
+        call.attempt += 1
+        LLM_RETRIES.inc(lane=call.lane)
+        with self._cond:
+            self._counts["retries"] += 1
+        # Full jitter, and never before the circuit lets calls through again
+        cap = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (call.attempt - 1))
+        delay = max(random.uniform(0, cap), self.breaker.retry_after())
+        timer = threading.Timer(delay, self._requeue, (call,))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, call: _Call):
+        with self._cond:
+            self._queues[call.lane].appendleft(call)
+            self._cond.notify()
+
+    def stats(self) -> Dict:
+        """Queue depths, calls in progress per lane, circuit state and call counts"""
+        with self._cond:
+            stats = dict(self._counts)
+            stats["queued"] = {lane: len(queue) for lane, queue in self._queues.items()}
+            stats["running"] = dict(self._running)
+            stats["abandoned"] = self._abandoned
+        stats["circuit"] = self.breaker.state
+        stats["circuit_opened"] = self.breaker.times_opened
+        return stats
@@ -0,0 +1,317 @@
+"""In-process metrics with Prometheus text exposition"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond matching to multi-second LLM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# Stage timings of the current request, in seconds (None outside a timed request)
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class for labelled metrics"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            values = self._values or ({(): 0} if not self.labelnames else {})
+            for key, value in sorted(values.items()):
+                labels = dict(zip(self.labelnames, key))
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative histogram of observed values"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def summary(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """(count, sum) per label set"""
+        with self._lock:
+            return {key: (sum(counts), total[0]) for key, (counts, total) in self._values.items()}
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    bucket_labels = {**labels, "le": _format_value(bound)}
+                    lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total[0])}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                labels = dict(zip(self.labelnames, key))
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def register_collector(
+        self,
+        collector: Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]
+    ):
+        """
+        Register a callback evaluated at render time
+
+        The callback yields (name, documentation, labels, value) gauge samples,
+        which is how stats kept elsewhere (caches, batchers) are exported.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+
+        described = set()
+        for collector in self._collectors:
+            for name, documentation, labels, value in collector():
+                if name not in described:
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} gauge")
+                    described.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "classification_stage_seconds",
+    "Time spent in each classification stage",
+    ["stage"]
+)
+STARTUP_PHASE_SECONDS = REGISTRY.gauge(
+    "startup_phase_seconds",
+    "Duration of each startup phase",
+    ["phase"]
+)
+PROMPT_TOKENS = REGISTRY.histogram(
+    "llm_prompt_tokens",
+    "Estimated prompt size in tokens",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+)
+CANDIDATES = REGISTRY.histogram(
+    "classification_candidates",
+    "Candidate categories sent to the LLM per page",
+    buckets=(5, 10, 15, 20, 30, 40, 55, 80, 120)
+)
+LLM_CALLS = REGISTRY.counter(
+    "llm_calls_total",
+    "LLM round trips, by single-page or multi-page prompt",
+    ["mode"]
+)
+LLM_QUEUE_SECONDS = REGISTRY.histogram(
+    "llm_queue_seconds",
+    "Time LLM calls waited in the scheduler before their first attempt",
+    ["lane"]
+)
+LLM_RETRIES = REGISTRY.counter(
+    "llm_retries_total",
+    "LLM call attempts retried after a transient failure",
+    ["lane"]
+)
+LLM_TIMEOUTS = REGISTRY.counter(
+    "llm_timeouts_total",
+    "LLM call attempts that exceeded the scheduler timeout"
+)
+LLM_REJECTED = REGISTRY.counter(
+    "llm_circuit_rejections_total",
+    "LLM call attempts rejected while the circuit breaker was open",
+    ["lane"]
+)
+MULTI_ITEM_FALLBACKS = REGISTRY.counter(
+    "llm_multi_item_fallbacks_total",
+    "Items of multi-page prompts that fell back to a single-page call"
+)
+LLM_ERRORS = REGISTRY.counter(
+    "llm_errors_total",
+    "LLM calls that raised an error"
+)
+PARSE_FAILURES = REGISTRY.counter(
+    "llm_parse_failures_total",
+    "LLM responses that could not be parsed into a category list"
+)
+BATCH_ROWS = REGISTRY.counter(
+    "batch_rows_total",
+    "Rows processed by batch classification",
+    ["status"]
+)
+COALESCED_REQUESTS = REGISTRY.counter(
+    "classify_coalesced_total",
+    "Classification requests that joined an identical in-flight request"
+)
+RELOADS = REGISTRY.counter(
+    "training_data_reloads_total",
+    "Training data reloads, by outcome",
+    ["status"]
+)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as a classification stage, recording it for the current request too"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def startup_phase(name: str):
+    """Time a startup phase"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_PHASE_SECONDS.set(time.perf_counter() - start, phase=name)
+
+
+def start_request_timing() -> Dict[str, float]:
+    """Start collecting stage timings for the current request and return the collection"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """Format stage timings as a Server-Timing header value (durations in milliseconds)"""
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
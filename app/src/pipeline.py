@@ -1,16 +1,38 @@
 """Main classification pipeline"""
-import pandas as pd
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
 from collections import Counter
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Optional, Sequence, Tuple
 from .embeddings import EmbeddingGenerator
-from .category_matcher import CategoryMatcher
+from .batcher import EmbeddingMicroBatcher
+from .category_matcher import CandidatePruning, CategoryMatcher
 from .classifier import TextClassifier
 from .cos_reader import COSReader
+from .embedding_store import EmbeddingStore
+from .llm_cache import LLMResultCache
+from .llm_scheduler import BATCH, LLMScheduler
+from .example_selector import ExampleSelector, estimate_tokens
+from .knn import KNNLabelPredictor
+from .ingest import read_training_data
+from .metrics import BATCH_ROWS, CANDIDATES, RELOADS, stage
+from .serving_state import ServingState, content_hash, embed_incrementally, hash_matrix
+from .vectors import EMBEDDING_DTYPES, as_embedding_matrix
+from .snapshot import SnapshotStore
+from .taxonomy_index import TaxonomyIndex
+from .singleflight import SingleFlight
 
 
 class ClassificationPipeline:
     """End-to-end text classification pipeline"""
     
+    # Texts are truncated to this many words before embedding and prompting
+    max_words = 500
+    
     def __init__(
         self,
         watsonx_api_key: str,
@@ -20,19 +42,112 @@ class ClassificationPipeline:
         cos_api_key: Optional[str] = None,
         cos_endpoint: Optional[str] = None,
         cos_bucket: Optional[str] = None,
-        cos_object_key: Optional[str] = None
+        cos_object_key: Optional[str] = None,
+        cpu_workers: Optional[int] = None,
+        max_concurrent_llm_calls: int = 32,
+        embedding_cache_dir: Optional[str] = None,
+        llm_cache: Optional[LLMResultCache] = None,
+        llm_scheduler: Optional[LLMScheduler] = None,
+        embed_batch_max_size: int = 32,
+        embed_batch_max_wait_ms: float = 5.0,
+        example_strategy: str = "static",
+        example_token_budget: int = 1500,
+        example_max_words: int = 120,
+        max_examples: int = 5,
+        cascade_threshold: Optional[float] = None,
+        knn_neighbors: int = 15,
+        embedding_generator: Optional[EmbeddingGenerator] = None,
+        classifier: Optional[TextClassifier] = None,
+        llm_items_per_prompt: int = 1,
+        data_chunksize: Optional[int] = None,
+        cos_cache_dir: Optional[str] = None,
+        snapshot_dir: Optional[str] = None,
+        embedding_backend: str = "torch",
+        embedding_threads: Optional[int] = None,
+        embedding_onnx_file: Optional[str] = None,
+        coalesce_requests: bool = True,
+        candidate_pruning: Optional[CandidatePruning] = None,
+        embedding_dtype: str = "float32",
+        category_level: Optional[int] = 3,
+        taxonomy_beam_width: int = 20,
+        taxonomy_level_weights: Sequence[float] = (1.0,)
     ):
         self.data_path = data_path
+        self.data_chunksize = data_chunksize
         self.use_cos = use_cos
         self.cos_bucket = cos_bucket
         self.cos_object_key = cos_object_key
         
-        self.embedding_generator = EmbeddingGenerator()
-        self.classifier = TextClassifier(
+        # Few-shot examples: "static" uses a fixed random sample for every prompt,
+        # "knn" retrieves the most similar labeled rows per request
+        if example_strategy not in ("static", "knn"):
+            raise ValueError("example_strategy must be 'static' or 'knn'")
+        self.example_strategy = example_strategy
+        self.example_token_budget = example_token_budget
+        self.example_max_words = example_max_words
+        self.max_examples = max_examples
+        
+        # Cascade: answer from kNN voting when its confidence reaches the
+        # threshold and only escalate uncertain texts to the LLM (None disables)
+        self.cascade_threshold = cascade_threshold
+        self.knn_neighbors = knn_neighbors
+        self._cascade_lock = threading.Lock()
+        self.cascade_counts = {"knn": 0, "llm": 0}
+        
+        # Categories: one label path level, or None for full paths searched through a TaxonomyIndex
+        self.category_level = category_level
+        self.taxonomy_beam_width = taxonomy_beam_width
+        self.taxonomy_level_weights = taxonomy_level_weights
+        
+        # Adaptive candidate lists: k becomes an upper bound cut by score rules (None keeps k)
+        self.candidate_pruning = candidate_pruning
+        
+        # Batch path: pages packed into each LLM prompt (1 sends one page per call)
+        self.llm_items_per_prompt = max(1, llm_items_per_prompt)
+        
+        # Storage type of the training text embedding matrix (float16 halves its size)
+        if embedding_dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"embedding_dtype must be one of: {', '.join(EMBEDDING_DTYPES)}")
+        self.embedding_dtype = embedding_dtype
+        
+        self.embedding_generator = embedding_generator or EmbeddingGenerator(
+            backend=embedding_backend,
+            num_threads=embedding_threads,
+            onnx_file=embedding_onnx_file
+        )
+        
+        # Micro-batch concurrent single-text encodes (disabled when max size is 1)
+        self.embedding_batcher = None
+        if embed_batch_max_size > 1:
+            self.embedding_batcher = EmbeddingMicroBatcher(
+                self.embedding_generator,
+                max_batch_size=embed_batch_max_size,
+                max_wait_ms=embed_batch_max_wait_ms
+            )
+        self.classifier = classifier or TextClassifier(
             api_key=watsonx_api_key,
-            project_id=watsonx_project_id
+            project_id=watsonx_project_id,
+            cache=llm_cache,
+            scheduler=llm_scheduler
         )
         
+        # Executor for CPU-bound work (encoding, matching) on the async path
+        self.executor = ThreadPoolExecutor(
+            max_workers=cpu_workers or os.cpu_count() or 1,
+            thread_name_prefix="pipeline-cpu"
+        )
+        self.max_concurrent_llm_calls = max_concurrent_llm_calls
+        self._llm_semaphore = None
+        
+        # Concurrent identical /classify requests share one computation
+        self.singleflight = SingleFlight() if coalesce_requests else None
+        
+        # Persisted embedding artifacts, reused across restarts
+        self.embedding_store = EmbeddingStore(embedding_cache_dir) if embedding_cache_dir else None
+        
+        # Prepared state shared read-only by worker processes through memory-mapped files
+        self.snapshot_store = SnapshotStore(snapshot_dir) if snapshot_dir else None
+        
         # Initialize COS reader if needed
         self.cos_reader = None
         if use_cos:
@@ -43,81 +158,162 @@ class ClassificationPipeline:
                 )
             self.cos_reader = COSReader(
                 api_key=cos_api_key,
-                endpoint_url=cos_endpoint
+                endpoint_url=cos_endpoint,
+                cache_dir=cos_cache_dir
             )
         
-        # Initialize data structures
-        self.df = None
-        self.unique_categories = None
-        self.category_matcher = None
-        self.bucket_map = None
-        self.examples_string = None
+        # Training data and derived structures, replaced as a whole by reload()
+        self.state = ServingState()
+        self._reload_lock = threading.Lock()
+        self.last_reload = {"in_progress": False}
+    
+    # Read-only views of the current serving state
+    df = property(lambda self: self.state.df)
+    unique_categories = property(lambda self: self.state.unique_categories)
+    category_matcher = property(lambda self: self.state.category_matcher)
+    bucket_map = property(lambda self: self.state.bucket_map)
+    examples_string = property(lambda self: self.state.examples_string)
+    example_selector = property(lambda self: self.state.example_selector)
+    knn_predictor = property(lambda self: self.state.knn_predictor)
+    
+    def data_fingerprint(self) -> str:
+        """Fingerprint of the training data source: ETag in COS, mtime and size locally"""
+        if self.use_cos and self.cos_reader:
+            metadata = self.cos_reader.head(bucket=self.cos_bucket, object_key=self.cos_object_key)
+            return metadata.get("ETag", "").strip('"')
+        stat = os.stat(self.data_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
     
-    def load_and_prepare_data(self):
+    def load_and_prepare_data(self, state: Optional[ServingState] = None):
         """Load and prepare training data"""
-        # Load data from COS or local file
+        state = self.state if state is None else state
+        
+        # Taken before reading, so a change made during the read is picked up by the next poll
+        state.source_fingerprint = self.data_fingerprint()
+        
+        # Load data from COS (through the local download cache) or local file (CSV or Parquet)
         if self.use_cos and self.cos_reader:
-            self.df = self.cos_reader.read_csv(
+            source = self.cos_reader.download(
                 bucket=self.cos_bucket,
                 object_key=self.cos_object_key
             )
         else:
-            self.df = pd.read_csv(self.data_path)
-        
-        self.df['label'] = self.df['label'].apply(eval)
-        self.df['text'] = self.df['text'].apply(lambda x: ' '.join(str(x).split()[:500]))
+            source = self.data_path
         
-        # Replace underscores with spaces
-        self.df['label'] = self.df['label'].apply(
-            lambda labels: [label.replace("_", " ") for label in labels] if isinstance(labels, list) else labels
+        # Parse labels, truncate text, extract the categories and drop rows without any
+        state.df = read_training_data(
+            source,
+            max_words=self.max_words,
+            chunksize=self.data_chunksize,
+            level=self.category_level
         )
         
-        # Extract third-level categories
-        self.df['categories'] = self.df['label'].apply(lambda lst: [
-            '/'.join(s.strip('/').split('/')[2:3])
-            for s in lst
-            if len(s.strip('/').split('/')) >= 3
-        ])
-        
-        # Remove duplicates and filter empty categories
-        self.df['categories'] = self.df['categories'].apply(lambda lst: list(dict.fromkeys(lst)))
-        self.df['categories_count'] = self.df['categories'].apply(len)
-        self.df = self.df[self.df['categories_count'] != 0]
-        
         # Get unique categories
-        self.unique_categories = sorted(set(cat for row in self.df['categories'] for cat in row))
+        state.set_categories(sorted(state.df['categories'].explode().dropna().unique()))
         
         return self
     
-    def generate_embeddings(self):
-        """Generate embeddings for categories and text"""
-        # Embed categories
-        category_embeddings = self.embedding_generator.encode(self.unique_categories)
+    def generate_embeddings(
+        self,
+        state: Optional[ServingState] = None,
+        previous: Optional[ServingState] = None
+    ):
+        """
+        Generate embeddings for categories and text
         
-        # Embed text
-        content = self.df['text'].astype(str).tolist()
-        content_embeddings = self.embedding_generator.encode(content)
-        self.df['text_embedding'] = list(content_embeddings)
+        With a previous state, only texts and categories whose content is not
+        already embedded there are encoded.
+        """
+        state = self.state if state is None else state
+        content = state.df['text'].astype(str).tolist()
         
-        # Initialize category matcher
-        self.category_matcher = CategoryMatcher(
-            categories=self.unique_categories,
-            category_embeddings=list(category_embeddings)
-        )
+        # Reuse a persisted artifact when the dataset, model and truncation are unchanged
+        embeddings = None
+        if self.embedding_store is not None:
+            key = EmbeddingStore.compute_key(
+                model_name=self.embedding_generator.model_id,
+                texts=content,
+                categories=state.unique_categories,
+                max_words=self.max_words
+            )
+            embeddings = self.embedding_store.load(key)
+        
+        if embeddings is not None:
+            content_embeddings, category_embeddings = embeddings
+            state.text_hashes = [content_hash(text) for text in content]
+            state.category_hashes = [content_hash(cat) for cat in state.unique_categories]
+        else:
+            # Embed categories
+            category_embeddings, state.category_hashes, state.categories_encoded = embed_incrementally(
+                state.unique_categories,
+                self.embedding_generator.encode,
+                previous.category_hashes if previous is not None else None,
+                previous.category_embeddings if previous is not None else None
+            )
+            
+            # Embed text
+            content_embeddings, state.text_hashes, state.texts_encoded = embed_incrementally(
+                content,
+                self.embedding_generator.encode,
+                previous.text_hashes if previous is not None else None,
+                previous.text_embeddings if previous is not None else None
+            )
+            
+            if self.embedding_store is not None:
+                self.embedding_store.save(
+                    key,
+                    content_embeddings,
+                    category_embeddings,
+                    model_name=self.embedding_generator.model_id,
+                    max_words=self.max_words
+                )
+        
+        state.text_embeddings = as_embedding_matrix(content_embeddings, self.embedding_dtype)
+        state.category_embeddings = category_embeddings
+        
+        self._build_category_matcher(state)
+        self._build_knn_predictor(state)
         
         return self
     
-    def create_frequency_buckets(self):
+    def _build_category_matcher(self, state: ServingState):
+        """Build the candidate search: flat for single-level categories, hierarchical for full paths"""
+        if self.category_level is None:
+            state.category_matcher = TaxonomyIndex(
+                categories=state.unique_categories,
+                category_embeddings=state.category_embeddings,
+                beam_width=self.taxonomy_beam_width,
+                level_weights=self.taxonomy_level_weights
+            )
+        else:
+            state.category_matcher = CategoryMatcher(
+                categories=state.unique_categories,
+                category_embeddings=state.category_embeddings
+            )
+    
+    def _build_knn_predictor(self, state: ServingState):
+        """Build the cascade's kNN predictor when the cascade is enabled"""
+        if self.cascade_threshold is not None:
+            state.knn_predictor = KNNLabelPredictor(
+                embeddings=state.text_embeddings,
+                categories=state.df['categories'].tolist(),
+                labels=state.unique_categories,
+                n_neighbors=self.knn_neighbors
+            )
+    
+    def create_frequency_buckets(self, state: Optional[ServingState] = None):
         """Create frequency buckets for categories"""
-        all_labels = self.df['categories'].explode()
+        state = self.state if state is None else state
+        all_labels = state.df['categories'].explode()
         label_counts = Counter(all_labels)
-        self.bucket_map = self.category_matcher.create_frequency_buckets(label_counts)
+        state.bucket_map = state.category_matcher.create_frequency_buckets(label_counts)
         
         return self
     
-    def prepare_examples(self, n_samples: int = 10):
+    def prepare_examples(self, n_samples: int = 10, state: Optional[ServingState] = None):
         """Prepare example strings for prompting"""
-        sample = self.df.sample(n=n_samples, random_state=42)
+        state = self.state if state is None else state
+        sample = state.df.sample(n=n_samples, random_state=42)
         sample = sample[['url', 'text', 'categories']]
         
         result_string = []
@@ -125,38 +321,521 @@ class ClassificationPipeline:
             row_string = f"url:{r['url']}, page content:{r['text']}, Categories:{r['categories']}"
             result_string.append(row_string)
         
-        self.examples_string = "\n".join(result_string)
+        state.examples_string = "\n".join(result_string)
+        self._build_example_selector(state)
         
         return self
     
+    def _build_example_selector(self, state: ServingState):
+        """Build the example retriever when examples are selected per text"""
+        if self.example_strategy == "knn":
+            state.example_selector = ExampleSelector(
+                embeddings=state.text_embeddings,
+                urls=state.df['url'].tolist(),
+                texts=state.df['text'].tolist(),
+                categories=state.df['categories'].tolist(),
+                max_examples=self.max_examples,
+                token_budget=self.example_token_budget,
+                max_words_per_example=self.example_max_words
+            )
+    
+    def prepare_from_snapshot(self, prebuilt: bool = False):
+        """
+        Serve the shared snapshot of the current training data
+        
+        The first worker process to get here builds the snapshot with the
+        regular startup phases while the others wait; then every worker
+        memory-maps the same files.
+        
+        Args:
+            prebuilt: Serve the newest snapshot built with the current settings
+                even if the training data fingerprint differs (e.g. one built
+                while building the container image); one is built only when
+                there is none
+        """
+        self.state = self._snapshot_state(prebuilt=prebuilt)
+        return self
+    
+    def _snapshot_settings(self) -> Dict:
+        """Settings that change the snapshot content, besides the data itself"""
+        return {
+            "model_name": self.embedding_generator.model_id,
+            "max_words": self.max_words,
+            "embedding_dtype": self.embedding_dtype,
+            "category_level": self.category_level
+        }
+    
+    def _snapshot_state(
+        self, previous: Optional[ServingState] = None, prebuilt: bool = False
+    ) -> ServingState:
+        """Load the snapshot for the current data, building and saving it first if missing"""
+        settings = self._snapshot_settings()
+        load_texts = self.example_strategy == "knn"
+        with self.snapshot_store.lock():
+            key = self.snapshot_store.find(**settings) if prebuilt else None
+            if key is None:
+                key = SnapshotStore.compute_key(self.data_fingerprint(), **settings)
+            state = self.snapshot_store.load(key, load_texts=load_texts)
+            if state is None:
+                built = ServingState()
+                self.load_and_prepare_data(built)
+                self.generate_embeddings(built, previous=previous)
+                self.create_frequency_buckets(built)
+                self.prepare_examples(state=built)
+                key = SnapshotStore.compute_key(built.source_fingerprint, **settings)
+                self.snapshot_store.save(key, built, settings)
+                
+                # Serve the memory-mapped copy, so this worker shares pages with the others too
+                state = self.snapshot_store.load(key, load_texts=load_texts)
+                state.texts_encoded = built.texts_encoded
+                state.categories_encoded = built.categories_encoded
+        
+        # Buckets are recounted from the per-row categories, which also rebuilds taxonomy node buckets
+        self._build_category_matcher(state)
+        self.create_frequency_buckets(state)
+        self._build_knn_predictor(state)
+        self._build_example_selector(state)
+        self.compact_state(state)
+        return state
+    
+    def compact_state(self, state: Optional[ServingState] = None):
+        """
+        Drop what serving does not need once all phases have run
+        
+        The training DataFrame (full texts, raw labels, per-row categories) is
+        released: the kNN predictor keeps integer label ids, the example
+        selector its pre-rendered examples, and content hashes are packed into
+        one array for incremental reloads.
+        """
+        state = self.state if state is None else state
+        state.df = None
+        if state.text_hashes is not None:
+            state.text_hashes = hash_matrix(state.text_hashes)
+        if state.category_hashes is not None:
+            state.category_hashes = hash_matrix(state.category_hashes)
+        return self
+    
+    def warm_up(self, k: int = 55):
+        """
+        Encode one text and select its candidates, so that lazy initialization
+        in the embedding model and numerical libraries happens before the
+        first request instead of during it
+        """
+        state = self.state
+        embedding = self._encode_one("warm up")
+        state.category_matcher.get_top_k_categories(embedding, bucket_map=state.bucket_map, k=k)
+        if state.knn_predictor is not None:
+            state.knn_predictor.predict_batch([embedding])
+        if state.example_selector is not None:
+            state.example_selector.select(embedding)
+        return self
+    
+    def reload(self, blocking: bool = True) -> bool:
+        """
+        Rebuild the serving state from the current training data and swap it in
+        
+        The new dataset is loaded and prepared while requests keep being served
+        from the current state. Only texts and categories that are not already
+        embedded are encoded. The new state replaces the old one in a single
+        assignment, so in-flight requests finish on the state they started with.
+        
+        Args:
+            blocking: Wait for a reload that is already running instead of returning
+            
+        Returns:
+            False if blocking is False and a reload is already running, True otherwise
+        """
+        if not self._reload_lock.acquire(blocking=blocking):
+            return False
+        try:
+            self._rebuild_state()
+        finally:
+            self._reload_lock.release()
+        return True
+    
+    def start_reload(self) -> bool:
+        """Run reload() in a background thread; False if a reload is already running"""
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        
+        def run():
+            try:
+                self._rebuild_state()
+            except Exception as e:
+                print(f"Training data reload failed: {e}")
+            finally:
+                self._reload_lock.release()
+        
+        threading.Thread(target=run, name="pipeline-reload", daemon=True).start()
+        return True
+    
+    def reload_if_changed(self) -> bool:
+        """Reload when the data source fingerprint differs from the served one"""
+        if self.data_fingerprint() == self.state.source_fingerprint:
+            return False
+        return self.reload(blocking=False)
+    
+    def _rebuild_state(self):
+        """Build a new serving state and swap it in (caller holds the reload lock)"""
+        previous = self.state
+        start = time.perf_counter()
+        self.last_reload = {"in_progress": True, "started_at": time.time()}
+        try:
+            if self.snapshot_store is not None:
+                state = self._snapshot_state(previous)
+            else:
+                state = ServingState()
+                self.load_and_prepare_data(state)
+                self.generate_embeddings(state, previous=previous)
+                self.create_frequency_buckets(state)
+                self.prepare_examples(state=state)
+                self.compact_state(state)
+            state.generation = previous.generation + 1
+        except Exception as e:
+            RELOADS.inc(status="error")
+            self.last_reload = {
+                "in_progress": False,
+                "error": str(e),
+                "seconds": time.perf_counter() - start
+            }
+            raise
+        
+        # Atomic swap: requests read self.state once and keep their reference
+        self.state = state
+        RELOADS.inc(status="ok")
+        self.last_reload = {"in_progress": False, "seconds": time.perf_counter() - start}
+    
+    def reload_stats(self) -> Dict:
+        """Generation and size of the served state, and the outcome of the last reload"""
+        state = self.state
+        return {
+            "generation": state.generation,
+            "source_fingerprint": state.source_fingerprint,
+            "rows": len(state.text_embeddings) if state.text_embeddings is not None else 0,
+            "categories": len(state.unique_categories) if state.unique_categories else 0,
+            "texts_encoded": state.texts_encoded,
+            "categories_encoded": state.categories_encoded,
+            "last_reload": dict(self.last_reload)
+        }
+    
+    def _truncate(self, text: str) -> str:
+        """Truncate text to the first max_words words"""
+        return ' '.join(str(text).split()[:self.max_words])
+    
+    def _filter_valid(
+        self, predicted_categories: List[str], state: Optional[ServingState] = None
+    ) -> List[str]:
+        """Keep only predicted categories that exist in the training data"""
+        state = self.state if state is None else state
+        return [
+            p.strip() for p in predicted_categories 
+            if isinstance(p, str) and p.strip() in state.valid_categories
+        ]
+    
+    def _encode_one(self, text: str):
+        """Embed a single truncated text, through the micro-batcher when enabled"""
+        if self.embedding_batcher is not None:
+            return self.embedding_batcher.encode_one(text)
+        return self.embedding_generator.encode([text])[0]
+    
+    def _knn_fast_path(
+        self, text_embeddings, state: Optional[ServingState] = None
+    ) -> List[Optional[List[str]]]:
+        """
+        Labels from kNN voting for each text whose confidence reaches the
+        cascade threshold, None for texts that must go to the LLM
+        """
+        state = self.state if state is None else state
+        if state.knn_predictor is None:
+            return [None] * len(text_embeddings)
+        
+        predictions = state.knn_predictor.predict_batch(
+            text_embeddings,
+            state.category_matcher.similarity(text_embeddings)
+        )
+        results = [
+            labels if labels and confidence >= self.cascade_threshold else None
+            for labels, confidence in predictions
+        ]
+        accepted = sum(r is not None for r in results)
+        with self._cascade_lock:
+            self.cascade_counts["knn"] += accepted
+            self.cascade_counts["llm"] += len(results) - accepted
+        return results
+    
+    def cascade_stats(self) -> Dict[str, float]:
+        """Counts of texts answered by kNN and escalated to the LLM"""
+        with self._cascade_lock:
+            knn, llm = self.cascade_counts["knn"], self.cascade_counts["llm"]
+        total = knn + llm
+        return {
+            "enabled": self.knn_predictor is not None,
+            "threshold": self.cascade_threshold,
+            "knn_accepted": knn,
+            "llm_escalated": llm,
+            "escalation_rate": llm / total if total else 0.0
+        }
+    
+    def _prompt_inputs(
+        self, text: str, k: int, state: ServingState
+    ) -> Tuple[Optional[List[str]], List[str], str]:
+        """
+        Embed a truncated text and return its kNN fast-path labels (None when
+        the LLM is needed), top k candidate categories and examples
+        """
+        with stage("encode"):
+            text_embedding = self._encode_one(text)
+        return self._match(text_embedding, k, state)
+    
+    def _match(
+        self, text_embedding, k: int, state: ServingState
+    ) -> Tuple[Optional[List[str]], List[str], str]:
+        """kNN fast-path labels, top k candidate categories and examples for an embedded text"""
+        if state.knn_predictor is not None:
+            with stage("knn"):
+                fast_labels = self._knn_fast_path([text_embedding], state)[0]
+            if fast_labels is not None:
+                return fast_labels, [], ""
+        
+        with stage("top_k"):
+            top_k_categories = state.category_matcher.get_top_k_categories(
+                text_embedding=text_embedding,
+                bucket_map=state.bucket_map,
+                k=k,
+                pruning=self.candidate_pruning
+            )
+        CANDIDATES.observe(len(top_k_categories))
+        if state.example_selector is not None:
+            with stage("examples"):
+                examples = state.example_selector.select(text_embedding)
+        else:
+            examples = state.examples_string
+        return None, top_k_categories, examples
+    
     def classify_text(self, url: str, text: str, k: int = 55) -> List[str]:
         """Classify a single text"""
-        # Truncate text to 500 words
-        text = ' '.join(str(text).split()[:500])
+        state = self.state
         
-        # Generate embedding
-        text_embedding = self.embedding_generator.encode([text])[0]
+        # Truncate text to max_words words
+        with stage("truncate"):
+            text = self._truncate(text)
         
-        # Get top k categories
-        top_k_categories = self.category_matcher.get_top_k_categories(
-            text_embedding=text_embedding,
-            bucket_map=self.bucket_map,
-            k=k
-        )
+        # Generate embedding, get top k categories and examples
+        fast_labels, top_k_categories, examples = self._prompt_inputs(text, k, state)
+        if fast_labels is not None:
+            with stage("filter"):
+                return self._filter_valid(fast_labels, state)
         
         # Predict final categories
         predicted_categories = self.classifier.predict_categories(
             url=url,
             text=text,
             top_k_categories=top_k_categories,
-            examples=self.examples_string
+            examples=examples
         )
         
         # Filter valid categories
-        valid_set = set(s.strip() for s in self.unique_categories)
-        predicted_categories = [
-            p.strip() for p in predicted_categories 
-            if isinstance(p, str) and p.strip() in valid_set
-        ]
+        with stage("filter"):
+            return self._filter_valid(predicted_categories, state)
+    
+    async def aclassify_text(self, url: str, text: str, k: int = 55) -> List[str]:
+        """
+        Classify a single text without blocking the event loop
+        
+        Encoding and matching run on the pipeline's CPU executor (a
+        micro-batched encode is awaited on the event loop instead) and the
+        Watsonx call is awaited, bounded by max_concurrent_llm_calls.
+        Concurrent identical requests share one classification when
+        coalescing is enabled.
+        """
+        state = self.state
+        with stage("truncate"):
+            text = self._truncate(text)
+        
+        if self.singleflight is None:
+            categories = await self._aclassify_truncated(url, text, k, state)
+        else:
+            categories = await self.singleflight.do(
+                (state.generation, url, text, k),
+                functools.partial(self._aclassify_truncated, url, text, k, state)
+            )
+        # Coalesced callers share the result, so each gets its own list
+        return list(categories)
+    
+    async def _aclassify_truncated(
+        self, url: str, text: str, k: int, state: ServingState
+    ) -> List[str]:
+        """Classify an already truncated text (the body of aclassify_text)"""
+        loop = asyncio.get_running_loop()
+        
+        # Run in a copy of the current context so stage timings reach this request
+        context = contextvars.copy_context()
+        if self.embedding_batcher is not None:
+            # Wait for the micro-batch on the event loop rather than in an executor
+            # thread, so a batch can hold more texts than the executor has threads
+            with stage("encode"):
+                text_embedding = await asyncio.wrap_future(self.embedding_batcher.submit(text))
+            fast_labels, top_k_categories, examples = await loop.run_in_executor(
+                self.executor, functools.partial(context.run, self._match, text_embedding, k, state)
+            )
+        else:
+            fast_labels, top_k_categories, examples = await loop.run_in_executor(
+                self.executor, functools.partial(context.run, self._prompt_inputs, text, k, state)
+            )
+        if fast_labels is not None:
+            with stage("filter"):
+                return self._filter_valid(fast_labels, state)
+        
+        if self._llm_semaphore is None:
+            self._llm_semaphore = asyncio.Semaphore(self.max_concurrent_llm_calls)
+        async with self._llm_semaphore:
+            predicted_categories = await self.classifier.apredict_categories(
+                url=url,
+                text=text,
+                top_k_categories=top_k_categories,
+                examples=examples
+            )
+        
+        with stage("filter"):
+            return self._filter_valid(predicted_categories, state)
+    
+    def classify_batch(
+        self,
+        urls: List[str],
+        texts: List[str],
+        k: int = 55,
+        max_concurrency: int = 8
+    ) -> List[Tuple[List[str], Optional[str]]]:
+        """
+        Classify many texts at once
+        
+        Texts are embedded in large batches and candidates are scored in bulk,
+        then the LLM calls are fanned out with bounded concurrency.
+        
+        Args:
+            urls: Page URLs
+            texts: Page contents, aligned with urls
+            k: Number of candidate categories per text
+            max_concurrency: Maximum number of concurrent LLM calls
+            
+        Returns:
+            One (categories, error) tuple per input row, in input order.
+            error is None on success and a message otherwise.
+        """
+        return list(self.iter_classify_batch(urls, texts, k=k, max_concurrency=max_concurrency))
+    
+    def iter_classify_batch(
+        self,
+        urls: List[str],
+        texts: List[str],
+        k: int = 55,
+        max_concurrency: int = 8
+    ) -> Iterator[Tuple[List[str], Optional[str]]]:
+        """
+        Like classify_batch, but yield each (categories, error) tuple in input
+        order as soon as it and the rows before it are done
+        """
+        if len(urls) != len(texts):
+            raise ValueError("urls and texts must have the same length")
+        if not texts:
+            return
+        
+        state = self.state
+        with stage("batch_truncate"):
+            texts = [self._truncate(text) for text in texts]
+        with stage("batch_encode"):
+            text_embeddings = self.embedding_generator.encode(texts)
+        with stage("batch_top_k"):
+            candidates = state.category_matcher.get_top_k_categories_batch(
+                text_embeddings=text_embeddings,
+                bucket_map=state.bucket_map,
+                k=k,
+                pruning=self.candidate_pruning
+            )
+        if state.example_selector is not None:
+            with stage("batch_examples"):
+                examples = state.example_selector.select_batch(text_embeddings)
+        else:
+            examples = [state.examples_string] * len(texts)
+        with stage("batch_knn"):
+            fast_labels = self._knn_fast_path(text_embeddings, state)
+        
+        def predict(i: int) -> Tuple[List[str], Optional[str]]:
+            if fast_labels[i] is not None:
+                BATCH_ROWS.inc(status="knn")
+                return self._filter_valid(fast_labels[i], state), None
+            CANDIDATES.observe(len(candidates[i]))
+            try:
+                predicted_categories = self.classifier.predict_categories(
+                    url=urls[i],
+                    text=texts[i],
+                    top_k_categories=candidates[i],
+                    examples=examples[i],
+                    lane=BATCH
+                )
+                BATCH_ROWS.inc(status="ok")
+                return self._filter_valid(predicted_categories, state), None
+            except Exception as e:
+                BATCH_ROWS.inc(status="error")
+                return [], str(e)
+        
+        def predict_group(group: List[int]) -> Dict[int, Tuple[List[str], Optional[str]]]:
+            for i in group:
+                CANDIDATES.observe(len(candidates[i]))
+            try:
+                results = self.classifier.predict_categories_multi(
+                    items=[(urls[i], texts[i], candidates[i]) for i in group],
+                    examples=self._shared_examples([examples[i] for i in group], state),
+                    lane=BATCH
+                )
+            except Exception as e:
+                # Report it on each row of the group instead of failing the whole batch
+                results = [e] * len(group)
+            outcomes = {}
+            for i, result in zip(group, results):
+                if isinstance(result, Exception):
+                    BATCH_ROWS.inc(status="error")
+                    outcomes[i] = ([], str(result))
+                else:
+                    BATCH_ROWS.inc(status="ok")
+                    outcomes[i] = (self._filter_valid(result, state), None)
+            return outcomes
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            if self.llm_items_per_prompt == 1:
+                yield from executor.map(predict, range(len(texts)))
+                return
+            
+            # Pack the rows that need the LLM into multi-page prompts
+            pending = [i for i in range(len(texts)) if fast_labels[i] is None]
+            futures = {}
+            for start in range(0, len(pending), self.llm_items_per_prompt):
+                group = pending[start:start + self.llm_items_per_prompt]
+                future = executor.submit(predict_group, group)
+                for i in group:
+                    futures[i] = future
+            
+            for i in range(len(texts)):
+                if i in futures:
+                    try:
+                        yield futures[i].result()[i]
+                    except Exception as e:
+                        BATCH_ROWS.inc(status="error")
+                        yield [], str(e)
+                else:
+                    yield predict(i)
+    
+    def _shared_examples(self, examples: List[str], state: ServingState) -> str:
+        """Merge per-page examples into one examples string for a multi-page prompt"""
+        if state.example_selector is None:
+            return state.examples_string
         
-        return predicted_categories
+        # Unique example lines, in order, within the example token budget
+        merged, used = [], 0
+        for line in dict.fromkeys(line for e in examples for line in e.split("\n") if line):
+            tokens = estimate_tokens(line)
+            if used + tokens > self.example_token_budget:
+                continue
+            merged.append(line)
+            used += tokens
+        return "\n".join(merged)
@@ -0,0 +1,71 @@
+"""Progress of the background startup, reported by the readiness endpoint"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from .metrics import startup_phase
+
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+
+class StartupProgress:
+    """Status and duration of each startup phase"""
+
+    def __init__(self, phases: List[str]):
+        """
+        Initialize with every phase pending
+
+        Args:
+            phases: Names of the phases, in the order they run
+        """
+        self._lock = threading.Lock()
+        self._phases: Dict[str, Dict] = {
+            name: {"status": "pending", "seconds": None} for name in phases
+        }
+        self._started = time.perf_counter()
+        self._finished: Optional[float] = None
+        self.status = STARTING
+        self.error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    @contextmanager
+    def phase(self, name: str):
+        """Run a block as a phase: mark it running, then done or failed, and record its duration"""
+        start = time.perf_counter()
+        with self._lock:
+            self._phases.setdefault(name, {})["status"] = "running"
+        try:
+            with startup_phase(name):
+                yield
+        except BaseException:
+            with self._lock:
+                self._phases[name].update(status="failed", seconds=time.perf_counter() - start)
+            raise
+        with self._lock:
+            self._phases[name].update(status="done", seconds=time.perf_counter() - start)
+
+    def finish(self, error: Optional[BaseException] = None):
+        """Mark the startup as ready, or as failed with error"""
+        with self._lock:
+            self._finished = time.perf_counter()
+            self.status = FAILED if error is not None else READY
+            self.error = str(error) if error is not None else None
+
+    def report(self) -> Dict:
+        """Overall status, share of phases done, elapsed time and per-phase status and durations"""
+        with self._lock:
+            phases = {name: dict(phase) for name, phase in self._phases.items()}
+            end = self._finished if self._finished is not None else time.perf_counter()
+            done = sum(phase["status"] == "done" for phase in phases.values())
+            return {
+                "status": self.status,
+                "error": self.error,
+                "progress": done / len(phases) if phases else 1.0,
+                "elapsed_seconds": end - self._started,
+                "phases": phases,
+            }
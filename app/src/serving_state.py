@@ -0,0 +1,143 @@
+"""Training data and the structures derived from it, swapped as one unit on reload"""
+import hashlib
+import mmap
+import sys
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+def content_hash(text: str) -> bytes:
+    """Digest of a text, used to match embeddings across dataset versions"""
+    return hashlib.blake2b(str(text).encode("utf-8"), digest_size=16).digest()
+
+
+def hash_matrix(hashes) -> np.ndarray:
+    """Content hashes as one (n, 16) uint8 array instead of n bytes objects"""
+    if isinstance(hashes, np.ndarray):
+        return hashes
+    return np.frombuffer(b"".join(hashes), dtype=np.uint8).reshape(-1, 16)
+
+
+def embed_incrementally(
+    texts: Sequence[str],
+    encode: Callable[[List[str]], np.ndarray],
+    previous_hashes: Optional[Sequence[bytes]] = None,
+    previous_embeddings: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, List[bytes], int]:
+    """
+    Embed texts, reusing previous embeddings of texts with the same content
+
+    Args:
+        texts: Texts to embed
+        encode: Function embedding a list of texts into a matrix
+        previous_hashes: Content hashes of the previously embedded texts
+        previous_embeddings: Embeddings aligned with previous_hashes
+
+    Returns:
+        Tuple of (embeddings aligned with texts, content hashes, number of texts encoded)
+    """
+    hashes = [content_hash(text) for text in texts]
+    if previous_embeddings is None or previous_hashes is None or not len(previous_embeddings):
+        return np.asarray(encode(list(texts))), hashes, len(texts)
+
+    # bytes() also accepts rows of a (n, 16) uint8 hash array loaded from a snapshot
+    known = {bytes(h): i for i, h in enumerate(previous_hashes)}
+
+    # Encode each unseen text once, even when it occurs in several rows
+    unseen = {}
+    for h, text in zip(hashes, texts):
+        if h not in known:
+            unseen.setdefault(h, text)
+
+    embeddings = np.empty((len(texts), previous_embeddings.shape[1]), dtype=previous_embeddings.dtype)
+    reused = [i for i, h in enumerate(hashes) if h in known]
+    if reused:
+        embeddings[reused] = previous_embeddings[[known[hashes[i]] for i in reused]]
+    if unseen:
+        encoded = np.asarray(encode(list(unseen.values())))
+        rows = {h: j for j, h in enumerate(unseen)}
+        fresh = [i for i, h in enumerate(hashes) if h not in known]
+        embeddings[fresh] = encoded[[rows[hashes[i]] for i in fresh]]
+    return embeddings, hashes, len(unseen)
+
+
+class ServingState:
+    """
+    Everything the pipeline derives from one version of the training data
+
+    Requests read the pipeline's current state once and use it throughout,
+    and a reload builds a new state before swapping it in, so in-flight
+    requests never mix structures from two dataset versions.
+    """
+
+    def __init__(self, generation: int = 0):
+        self.generation = generation
+        # Fingerprint of the data source when it was read (mtime and size, or ETag)
+        self.source_fingerprint = None
+        # Training rows; only kept while the state is being built
+        self.df = None
+        self.unique_categories = None
+        self.valid_categories = frozenset()
+        self.text_embeddings = None
+        self.text_hashes = None
+        self.category_embeddings = None
+        self.category_hashes = None
+        self.texts_encoded = 0
+        self.categories_encoded = 0
+        self.category_matcher = None
+        self.bucket_map = None
+        self.examples_string = None
+        self.example_selector = None
+        self.knn_predictor = None
+
+    def set_categories(self, categories: List[str]):
+        """Set the category names and the lookup used to validate LLM answers"""
+        self.unique_categories = list(categories)
+        self.valid_categories = frozenset(c.strip() for c in self.unique_categories)
+
+    def memory_usage(self) -> Dict[str, Dict]:
+        """
+        Approximate memory held by each component
+
+        Returns:
+            Component name -> {"bytes": size, "mapped": True for memory-mapped
+            arrays, which are shared through the page cache}
+        """
+        def array(a) -> Dict:
+            if a is None:
+                return {"bytes": 0, "mapped": False}
+            a = np.asarray(a) if not isinstance(a, np.ndarray) else a
+            # Views of a memory map (e.g. after np.asarray) keep it as their base
+            base, mapped = a, False
+            while base is not None and not mapped:
+                mapped = isinstance(base, (np.memmap, mmap.mmap))
+                base = getattr(base, "base", None)
+            return {"bytes": int(a.nbytes), "mapped": mapped}
+
+        def strings(values) -> int:
+            return sum(sys.getsizeof(v) for v in values or ())
+
+        usage = {
+            "text_embeddings": array(self.text_embeddings),
+            "text_hashes": array(hash_matrix(self.text_hashes) if self.text_hashes is not None else None),
+            "category_embeddings": array(self.category_embeddings),
+        }
+        if self.category_matcher is not None:
+            matcher = self.category_matcher
+            usage["category_matcher"] = {
+                "bytes": matcher.nbytes() + strings(matcher.categories),
+                "mapped": False
+            }
+        if self.knn_predictor is not None:
+            usage["knn_labels"] = {
+                "bytes": int(self.knn_predictor.label_ids.nbytes + self.knn_predictor.label_offsets.nbytes),
+                "mapped": False
+            }
+        examples = sys.getsizeof(self.examples_string or "")
+        if self.example_selector is not None:
+            examples += strings(self.example_selector.example_strings)
+            examples += int(self.example_selector.example_tokens.nbytes)
+        usage["examples"] = {"bytes": examples, "mapped": False}
+        if self.df is not None:
+            usage["dataframe"] = {"bytes": int(self.df.memory_usage(deep=True).sum()), "mapped": False}
+        return usage
@@ -0,0 +1,58 @@
+"""Single-flight deduplication of concurrent identical async calls"""
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+from .metrics import COALESCED_REQUESTS, stage
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Let concurrent callers with the same key share one in-progress computation"""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn, or wait for the running call with the same key
+
+        The computation runs as its own task and each caller awaits it through
+        asyncio.shield, so a caller that is cancelled (e.g. a client that
+        disconnects) does not cancel the work shared with the others.
+
+        Args:
+            key: Identity of the call; callers with equal keys share one result
+            fn: Coroutine function computing the result
+
+        Returns:
+            The result of fn (errors are raised to every waiting caller)
+        """
+        task = self._in_flight.get(key)
+        with self._lock:
+            self.calls += 1
+            if task is not None:
+                self.coalesced += 1
+        if task is not None:
+            COALESCED_REQUESTS.inc()
+            with stage("coalesced"):
+                return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fn())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, float]:
+        """Calls, calls that joined an in-flight computation, and their share"""
+        with self._lock:
+            calls, coalesced = self.calls, self.coalesced
+        return {
+            "calls": calls,
+            "coalesced": coalesced,
+            "coalescing_rate": coalesced / calls if calls else 0.0,
+            "in_flight": len(self._in_flight)
+        }
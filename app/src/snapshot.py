@@ -0,0 +1,196 @@
+"""Prepared serving state on disk, shared read-only by worker processes"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+from .serving_state import ServingState, hash_matrix
+from .vectors import as_embedding_matrix
+
+
+class SnapshotStore:
+    """
+    Save a prepared ServingState once and load it memory-mapped in every worker
+
+    Embedding matrices are stored as .npy files and opened with mmap_mode='r',
+    so worker processes on the same host share one copy through the page
+    cache. Each snapshot lives in its own directory keyed by the data source
+    fingerprint and the preparation settings.
+    """
+
+    FORMAT_VERSION = 1
+    MANIFEST = "manifest.json"
+    LOCK_FILE = ".lock"
+    ARRAYS = ("text_embeddings", "category_embeddings", "text_hashes", "category_hashes")
+    ROW_CATEGORIES = "row_categories.json"
+    ROW_TEXTS = "row_texts.json"
+
+    def __init__(self, directory: str):
+        """
+        Initialize the store
+
+        Args:
+            directory: Directory holding one sub-directory per snapshot key
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def compute_key(cls, source_fingerprint: str, **settings) -> str:
+        """
+        Compute the snapshot key for a data source version
+
+        Args:
+            source_fingerprint: Fingerprint of the training data source
+            **settings: Preparation settings that change the snapshot content
+
+        Returns:
+            Hex digest identifying the data version, settings and format
+        """
+        payload = json.dumps(
+            {"format": cls.FORMAT_VERSION, "source": source_fingerprint, **settings},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def lock(self):
+        """Hold an exclusive lock across processes, so only one of them builds a snapshot"""
+        with open(os.path.join(self.directory, self.LOCK_FILE), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def save(self, key: str, state: ServingState, settings: Optional[Dict] = None) -> str:
+        """
+        Save a prepared state and remove older snapshots
+
+        Older snapshots stay readable by processes that still have them mapped.
+
+        Args:
+            key: Snapshot key from compute_key
+            state: State after all preparation phases
+            settings: Preparation settings the key was computed with, recorded so
+                that find() can locate the snapshot without the data source
+
+        Returns:
+            Path of the snapshot directory
+        """
+        path = os.path.join(self.directory, key)
+        tmp_path = tempfile.mkdtemp(prefix=f".{key}.", dir=self.directory)
+        try:
+            arrays = {
+                "text_embeddings": as_embedding_matrix(state.text_embeddings),
+                "category_embeddings": np.asarray(state.category_embeddings, dtype=np.float32),
+                "text_hashes": hash_matrix(state.text_hashes),
+                "category_hashes": hash_matrix(state.category_hashes),
+            }
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+
+            with open(os.path.join(tmp_path, self.ROW_CATEGORIES), "w") as f:
+                json.dump([list(cats) for cats in state.df['categories']], f)
+            with open(os.path.join(tmp_path, self.ROW_TEXTS), "w") as f:
+                json.dump({"url": state.df['url'].astype(str).tolist(), "text": state.df['text'].tolist()}, f)
+
+            manifest = {
+                "key": key,
+                "source_fingerprint": state.source_fingerprint,
+                "n_rows": int(len(state.df)),
+                "categories": list(state.unique_categories),
+                "bucket_map": state.bucket_map,
+                "examples_string": state.examples_string,
+                "settings": settings,
+                "created_at": time.time(),
+            }
+            with open(os.path.join(tmp_path, self.MANIFEST), "w") as f:
+                json.dump(manifest, f)
+
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        for entry in os.listdir(self.directory):
+            if entry != key and not entry.startswith("."):
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+        return path
+
+    def find(self, **settings) -> Optional[str]:
+        """
+        Key of the newest snapshot prepared with the given settings, whatever its data source version
+
+        Used to serve a snapshot built ahead of time (e.g. while building the
+        container image) without checking the training data.
+
+        Args:
+            **settings: Preparation settings, as passed to save
+
+        Returns:
+            The snapshot key, or None if there is no such snapshot
+        """
+        found = []
+        for entry in os.listdir(self.directory):
+            try:
+                with open(os.path.join(self.directory, entry, self.MANIFEST)) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if manifest.get("key") == entry and manifest.get("settings") == settings:
+                found.append((manifest.get("created_at", 0), entry))
+        return max(found)[1] if found else None
+
+    def load(self, key: str, load_texts: bool = False) -> Optional[ServingState]:
+        """
+        Load a snapshot
+
+        The returned state has memory-mapped embeddings and a DataFrame with
+        the per-row categories, plus URLs and texts when load_texts is True.
+        The category matcher, kNN predictor and example selector are not
+        built; that is left to the caller.
+
+        Args:
+            key: Snapshot key from compute_key
+            load_texts: Also load training URLs and texts (needed for retrieved examples)
+
+        Returns:
+            The state, or None if no complete snapshot exists for the key
+        """
+        path = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(path, self.MANIFEST)) as f:
+                manifest = json.load(f)
+            arrays = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                for name in self.ARRAYS
+            }
+            with open(os.path.join(path, self.ROW_CATEGORIES)) as f:
+                columns = {"categories": json.load(f)}
+            if load_texts:
+                with open(os.path.join(path, self.ROW_TEXTS)) as f:
+                    columns.update(json.load(f))
+        except (OSError, ValueError):
+            return None
+        if manifest.get("key") != key or arrays["text_embeddings"].shape[0] != manifest.get("n_rows"):
+            return None
+
+        state = ServingState()
+        state.source_fingerprint = manifest["source_fingerprint"]
+        state.df = pd.DataFrame(columns)
+        state.set_categories(manifest["categories"])
+        state.text_embeddings = arrays["text_embeddings"]
+        state.category_embeddings = arrays["category_embeddings"]
+        state.text_hashes = arrays["text_hashes"]
+        state.category_hashes = arrays["category_hashes"]
+        state.bucket_map = manifest["bucket_map"]
+        state.examples_string = manifest["examples_string"]
+        return state
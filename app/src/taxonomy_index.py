@@ -0,0 +1,178 @@
+"""Hierarchical candidate search over full category paths"""
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .category_matcher import CandidatePruning, CategoryMatcher
+
+
+def split_path(category: str) -> Tuple[str, ...]:
+    """Segments of a category path, e.g. '/Sports/Soccer' -> ('Sports', 'Soccer')"""
+    return tuple(part for part in category.strip('/').split('/') if part)
+
+
+class TaxonomyIndex(CategoryMatcher):
+    """
+    Select candidate categories by descending the tree of category paths
+
+    Every path prefix of a category is a node of the tree. A node is
+    represented by the normalized mean embedding of the categories below it
+    (including itself), and routed on by its similarity to the text plus a
+    frequency bucket bonus scaled by a per-level weight. Starting from the
+    top-level nodes, only the beam_width best nodes of each level are
+    expanded. The categories reached on the way are ranked exactly like
+    CategoryMatcher ranks them (cosine similarity plus bucket bonus), so with
+    a beam covering the whole tree the result equals the flat top k, while
+    the scoring cost grows with beam width times branching factor instead of
+    with the number of categories.
+    """
+
+    def __init__(
+        self,
+        categories: List[str],
+        category_embeddings: list,
+        beam_width: int = 20,
+        level_weights: Sequence[float] = (1.0,)
+    ):
+        """
+        Initialize the index
+
+        Args:
+            categories: Full category paths such as '/Arts & Entertainment/Music/Jazz'
+            category_embeddings: Embeddings aligned with categories
+            beam_width: Nodes expanded per level
+            level_weights: Multiplier of the routing bucket bonus per level, starting
+                at the top level; the last one applies to all deeper levels
+        """
+        super().__init__(categories, category_embeddings)
+        self.beam_width = max(1, beam_width)
+        self.level_weights = tuple(level_weights) or (1.0,)
+        self._build_tree()
+
+    def _build_tree(self):
+        """Create the nodes, their child lists and their mean embeddings"""
+        node_ids: Dict[Tuple[str, ...], int] = {}
+        parents: List[int] = []
+        depths: List[int] = []
+        node_label: List[int] = []
+        for label, category in enumerate(self.categories):
+            parts = split_path(category)
+            parent = -1
+            for depth in range(1, len(parts) + 1):
+                node = node_ids.get(parts[:depth])
+                if node is None:
+                    node = node_ids[parts[:depth]] = len(parents)
+                    parents.append(parent)
+                    depths.append(depth)
+                    node_label.append(-1)
+                parent = node
+            if parent >= 0:
+                node_label[parent] = label
+
+        self.node_parent = np.array(parents, dtype=np.int64)
+        self.node_depth = np.array(depths, dtype=np.int64)
+        self.node_label = np.array(node_label, dtype=np.int64)
+        self.roots = np.flatnonzero(self.node_parent < 0)
+
+        # Children as CSR: the children of node n are child_ids[child_offsets[n]:child_offsets[n + 1]]
+        children = np.flatnonzero(self.node_parent >= 0)
+        order = np.argsort(self.node_parent[children], kind="stable")
+        self.child_ids = children[order]
+        counts = np.bincount(self.node_parent[children], minlength=len(parents))
+        self.child_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        # Mean embedding of the categories below each node
+        is_label = self.node_label >= 0
+        sums = np.zeros((len(parents), self.category_matrix.shape[1]), dtype=np.float32)
+        sums[is_label] = self.category_matrix[self.node_label[is_label]]
+        self.node_matrix = self._normalize(self._sum_subtrees(sums))
+        self.node_bonus = np.zeros(len(parents), dtype=np.float32)
+
+    def _sum_subtrees(self, values: np.ndarray) -> np.ndarray:
+        """Add each node's values into its ancestors, one level at a time from the deepest"""
+        for depth in range(int(self.node_depth.max(initial=0)), 1, -1):
+            nodes = np.flatnonzero(self.node_depth == depth)
+            np.add.at(values, self.node_parent[nodes], values[nodes])
+        return values
+
+    def create_frequency_buckets(self, label_counts: Counter) -> Dict[str, str]:
+        """Create frequency buckets for categories, and for routing, for every node"""
+        bucket_map = super().create_frequency_buckets(label_counts)
+
+        counts = np.zeros(len(self.node_parent), dtype=np.int64)
+        is_label = self.node_label >= 0
+        counts[is_label] = [label_counts.get(self.categories[i], 0) for i in self.node_label[is_label]]
+        counts = self._sum_subtrees(counts)
+
+        level_weights = np.array(
+            [self.level_weights[min(depth, len(self.level_weights)) - 1] for depth in self.node_depth],
+            dtype=np.float32
+        )
+        bucket_bonus = np.array(
+            [self.bucket_weights[self.frequency_bucket(int(count))] for count in counts],
+            dtype=np.float32
+        )
+        self.node_bonus = bucket_bonus * level_weights
+        return bucket_map
+
+    def nbytes(self) -> int:
+        arrays = (
+            self.node_matrix, self.node_bonus, self.node_parent, self.node_depth,
+            self.node_label, self.child_ids, self.child_offsets
+        )
+        return super().nbytes() + int(sum(a.nbytes for a in arrays))
+
+    def _reached_labels(self, query: np.ndarray, beam_width: int) -> np.ndarray:
+        """Indices of the categories reached by a beam descent for one normalized query"""
+        reached = []
+        frontier = self.roots
+        while frontier.size:
+            labels = self.node_label[frontier]
+            reached.append(labels[labels >= 0])
+
+            expandable = frontier[self.child_offsets[frontier + 1] > self.child_offsets[frontier]]
+            if expandable.size > beam_width:
+                route = self.node_matrix[expandable] @ query + self.node_bonus[expandable]
+                expandable = expandable[np.argpartition(-route, beam_width - 1)[:beam_width]]
+            frontier = np.concatenate(
+                [self.child_ids[self.child_offsets[n]:self.child_offsets[n + 1]] for n in expandable]
+            ) if expandable.size else expandable
+        return np.concatenate(reached)
+
+    def get_top_k_categories_batch(
+        self,
+        text_embeddings,
+        bucket_map: Optional[Dict[str, str]] = None,
+        k: int = 55,
+        pruning: Optional[CandidatePruning] = None
+    ) -> List[List[str]]:
+        """
+        Get top k categories for each text embedding by beam descent
+
+        When the beam reaches fewer than k categories, the descent is
+        repeated with the beam widened in proportion to the shortfall until
+        it does, so beams too narrow for k behave like the narrowest one
+        that reaches k. With pruning, each list is cut to the length its
+        rules allow, with k as the upper bound.
+        """
+        if k < 0:
+            # Slice semantics over all categories, as in CategoryMatcher
+            k = max(0, len(self.categories) + k)
+        queries = self._normalize(text_embeddings)
+        bonuses = self._bonuses_for(bucket_map)
+        wanted = min(k, len(self.categories))
+        results = []
+        for query in queries:
+            beam_width = self.beam_width
+            labels = self._reached_labels(query, beam_width)
+            while len(labels) < wanted and beam_width < len(self.node_parent):
+                # Smallest widening expected to reach k, so a narrower configured beam
+                # ends up no wider than needed (and never wider than a wider configured one)
+                beam_width = max(beam_width + 1, -(-beam_width * wanted // max(len(labels), 1)))
+                labels = self._reached_labels(query, beam_width)
+
+            scores = self.category_matrix[labels] @ query + bonuses[labels]
+            top = self._top_k_indices(scores.reshape(1, -1), k)
+            if pruning is not None and pruning.enabled:
+                top = top[:, :pruning.lengths(scores[top])[0]]
+            results.append([self.categories[labels[i]] for i in top[0]])
+        return results
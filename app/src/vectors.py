@@ -0,0 +1,47 @@
+"""Embedding matrices stored as float32 or float16"""
+import numpy as np
+
+EMBEDDING_DTYPES = {"float32": np.float32, "float16": np.float16}
+
+# Rows of a float16 matrix converted to float32 at a time when computing similarities
+_CHUNK_ROWS = 16384
+
+
+def as_embedding_matrix(embeddings, dtype=None) -> np.ndarray:
+    """
+    Contiguous float32 or float16 matrix, without copying when it already is one
+
+    Memory-mapped inputs stay memory-mapped unless a conversion is needed.
+
+    Args:
+        embeddings: Matrix or sequence of vectors
+        dtype: Target dtype name or type; None keeps float16 and converts anything else to float32
+
+    Returns:
+        2-D contiguous matrix
+    """
+    if isinstance(dtype, str):
+        dtype = EMBEDDING_DTYPES[dtype]
+    matrix = np.asarray(embeddings)
+    if dtype is None:
+        dtype = np.float16 if matrix.dtype == np.float16 else np.float32
+    matrix = np.ascontiguousarray(matrix, dtype=dtype)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+    return matrix
+
+
+def similarities(queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Dot products of float32 queries with every row of matrix, shape (n_queries, n_rows)
+
+    A float16 matrix is converted to float32 in chunks, so the product runs
+    through BLAS without materializing a float32 copy of the whole matrix.
+    """
+    if matrix.dtype != np.float16:
+        return queries @ matrix.T
+    result = np.empty((queries.shape[0], matrix.shape[0]), dtype=np.float32)
+    for start in range(0, matrix.shape[0], _CHUNK_ROWS):
+        block = matrix[start:start + _CHUNK_ROWS].astype(np.float32)
+        result[:, start:start + len(block)] = queries @ block.T
+    return result
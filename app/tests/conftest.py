@@ -0,0 +1,36 @@
+"""Shared fixtures: a small pipeline on the offline stand-ins from bench/fakes.py"""
+import pandas as pd
+import pytest
+from bench.fakes import FakeModelInference, HashingEmbeddingGenerator
+from src.classifier import TextClassifier
+from src.pipeline import ClassificationPipeline
+
+ROWS = [
+    ("https://a.example/1", "football match goals league season", "['/Sports/Team Sports/Soccer']"),
+    ("https://a.example/2", "basketball playoffs points rebounds", "['/Sports/Team Sports/Basketball']"),
+    ("https://a.example/3", "election parliament vote minister", "['/News/Politics/Elections']"),
+    ("https://a.example/4", "stock market shares earnings", "['/Finance/Investing/Stocks']"),
+]
+
+
+@pytest.fixture
+def make_pipeline(tmp_path):
+    data_path = tmp_path / "with_label.csv"
+    pd.DataFrame(ROWS, columns=["url", "text", "label"]).to_csv(data_path, index=False)
+
+    def make(model=None, **kwargs):
+        kwargs.setdefault("embed_batch_max_size", 1)
+        pipeline = ClassificationPipeline(
+            watsonx_api_key="",
+            watsonx_project_id="",
+            data_path=str(data_path),
+            embedding_generator=HashingEmbeddingGenerator(),
+            classifier=TextClassifier("", "", model=model or FakeModelInference(latency_ms=0, per_token_ms=0)),
+            **kwargs
+        )
+        pipeline.load_and_prepare_data()
+        pipeline.generate_embeddings()
+        pipeline.create_frequency_buckets()
+        pipeline.prepare_examples(n_samples=2)
+        return pipeline
+    return make
@@ -0,0 +1,56 @@
+"""Per-row error capture of ClassificationPipeline.classify_batch"""
+import pytest
+from bench.fakes import FakeModelInference
+
+
+class FailingOnModel(FakeModelInference):
+    """Fake model that raises for prompts mentioning a marker word"""
+
+    def __init__(self, marker: str):
+        super().__init__(latency_ms=0, per_token_ms=0)
+        self.marker = marker
+
+    def generate_text(self, prompt: str, guardrails: bool = False, params=None, **kwargs) -> str:
+        if self.marker in prompt:
+            raise RuntimeError("500 Internal Server Error")
+        return super().generate_text(prompt, guardrails=guardrails, params=params, **kwargs)
+
+
+def test_failed_row_does_not_fail_the_batch(make_pipeline):
+    pipeline = make_pipeline(FailingOnModel("zeppelin"))
+
+    results = pipeline.classify_batch(
+        urls=["u1", "u2", "u3"],
+        texts=["football league goals", "zeppelin", "stock shares earnings"],
+        k=4,
+        max_concurrency=2
+    )
+
+    assert len(results) == 3
+    assert results[1][0] == [] and "500" in results[1][1]
+    for categories, error in (results[0], results[2]):
+        assert error is None
+        assert categories
+
+
+def test_failed_multi_page_prompt_fails_only_its_rows(make_pipeline):
+    model = FailingOnModel("zeppelin")
+    pipeline = make_pipeline(model, llm_items_per_prompt=2)
+
+    results = pipeline.classify_batch(
+        urls=["u1", "u2", "u3"],
+        texts=["football league goals", "zeppelin", "stock shares earnings"],
+        k=4,
+        max_concurrency=2
+    )
+
+    # Rows 1 and 2 share the failed prompt; row 3 is prompted alone
+    assert [error is not None and "500" in error for _, error in results] == [True, True, False]
+    assert results[2][0]
+    assert model.calls == 1
+
+
+def test_mismatched_lengths_raise(make_pipeline):
+    pipeline = make_pipeline(FakeModelInference(latency_ms=0))
+    with pytest.raises(ValueError):
+        pipeline.classify_batch(urls=["u1"], texts=[], k=4)
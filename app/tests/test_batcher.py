@@ -0,0 +1,73 @@
+"""EmbeddingMicroBatcher"""
+import asyncio
+import threading
+import numpy as np
+import pytest
+from bench.fakes import HashingEmbeddingGenerator
+from src.batcher import EmbeddingMicroBatcher
+
+
+class GatedEmbeddingGenerator(HashingEmbeddingGenerator):
+    """Hashing embeddings whose encode calls wait for a gate and are recorded"""
+
+    def __init__(self):
+        super().__init__(dim=16)
+        self.gate = threading.Event()
+        self.calls = []
+
+    def encode(self, texts, normalize=True, batch_size=None):
+        self.gate.wait(5)
+        self.calls.append(list(texts))
+        if "boom" in texts:
+            raise RuntimeError("encode failed")
+        return super().encode(texts, normalize=normalize, batch_size=batch_size)
+
+
+def test_concurrent_requests_share_one_encode_call():
+    generator = GatedEmbeddingGenerator()
+    batcher = EmbeddingMicroBatcher(generator, max_batch_size=8, max_wait_ms=200)
+    try:
+        futures = [batcher.submit(f"text {i}") for i in range(8)]
+        generator.gate.set()
+        embeddings = [future.result(5) for future in futures]
+    finally:
+        batcher.close()
+
+    assert generator.calls == [[f"text {i}" for i in range(8)]]
+    expected = HashingEmbeddingGenerator(dim=16).encode([f"text {i}" for i in range(8)])
+    np.testing.assert_allclose(np.stack(embeddings), expected)
+    assert batcher.stats()["mean_batch_size"] == 8
+
+
+def test_async_classify_batches_beyond_the_cpu_executor(make_pipeline):
+    # Waiting for the batch must not hold an executor thread per text
+    pipeline = make_pipeline(cpu_workers=1, embed_batch_max_size=32, embed_batch_max_wait_ms=50)
+
+    async def classify_all():
+        return await asyncio.gather(*[
+            pipeline.aclassify_text(f"u{i}", f"football goals {i}", k=4) for i in range(16)
+        ])
+    results = asyncio.run(classify_all())
+
+    assert len(results) == 16
+    assert pipeline.embedding_batcher.stats()["mean_batch_size"] > 1
+
+
+def test_encode_error_reaches_every_caller_in_the_batch():
+    generator = GatedEmbeddingGenerator()
+    batcher = EmbeddingMicroBatcher(generator, max_batch_size=4, max_wait_ms=200)
+    try:
+        futures = [batcher.submit(text) for text in ("a", "boom", "c")]
+        generator.gate.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="encode failed"):
+                future.result(5)
+    finally:
+        batcher.close()
+
+
+def test_submit_after_close_raises():
+    batcher = EmbeddingMicroBatcher(HashingEmbeddingGenerator(dim=16))
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit("text")
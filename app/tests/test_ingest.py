@@ -0,0 +1,76 @@
+"""Training data ingestion"""
+import numpy as np
+import pandas as pd
+import pytest
+from src.ingest import parse_label_list, prepare_training_data, read_training_data, truncate_words
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("['/a/b/c', '/d/e/f']", ["/a/b/c", "/d/e/f"]),
+    ('["/a/b/c"]', ["/a/b/c"]),
+    ("['/it\\'s/b/c']", ["/it's/b/c"]),
+    ("[]", []),
+    (["/a/b/c"], ["/a/b/c"]),
+    (np.array(["/a/b/c"]), ["/a/b/c"]),
+])
+def test_parse_label_list(value, expected):
+    assert parse_label_list(value) == expected
+
+
+@pytest.mark.parametrize("value", [
+    "{[1]: 2}",                          # TypeError in ast.literal_eval
+    "['/a/b/c'",                         # SyntaxError
+    "__import__('os').system('true')",   # code is never evaluated
+    "'/a/b/c'",                          # not a list
+    "[" * 100000 + "]" * 100000,         # MemoryError/RecursionError
+    np.nan,
+    None,
+    42,
+], ids=["dict-with-list-key", "unclosed", "code", "string", "deeply-nested", "nan", "none", "int"])
+def test_malformed_labels_parse_to_nothing(value):
+    assert parse_label_list(value) == []
+
+
+def test_malformed_label_rows_are_dropped():
+    df = pd.DataFrame({
+        "url": ["u1", "u2", "u3"],
+        "text": ["one", "two", "three"],
+        "label": ["{[1]: 2}", "['/a/b/c', '/a/b/c', '/x/y/z']", "nonsense"],
+    })
+    prepared = prepare_training_data(df)
+    assert prepared["url"].tolist() == ["u2"]
+    assert prepared["categories"].iloc[0] == ["c", "z"]
+
+
+def test_empty_text_becomes_an_empty_string():
+    df = pd.DataFrame({
+        "url": ["u1", "u2"],
+        "text": [np.nan, "some text"],
+        "label": ["['/a/b/c']", "['/a/b/d']"],
+    })
+    texts = prepare_training_data(df)["text"].tolist()
+    assert texts == ["", "some text"]
+    assert all(isinstance(text, str) for text in texts)
+
+
+def test_truncate_words():
+    texts = pd.Series(["a  b\nc d", np.nan, 7])
+    assert truncate_words(texts, 3).tolist() == ["a b c", "", "7"]
+
+
+def test_full_path_categories():
+    df = pd.DataFrame({"url": ["u1"], "text": ["t"], "label": ["['//Arts_Music//Jazz/', '/Arts_Music']"]})
+    assert prepare_training_data(df, level=None)["categories"].iloc[0] == ["/Arts Music/Jazz", "/Arts Music"]
+
+
+def test_chunked_csv_matches_whole_file(tmp_path):
+    path = tmp_path / "data.csv"
+    pd.DataFrame({
+        "url": [f"u{i}" for i in range(10)],
+        "text": ["" if i % 4 == 0 else f"text {i}" for i in range(10)],
+        "label": ["{[1]: 2}" if i % 3 == 0 else f"['/a/b/c{i % 2}']" for i in range(10)],
+    }).to_csv(path, index=False)
+
+    whole = read_training_data(str(path))
+    chunked = read_training_data(str(path), chunksize=3)
+    pd.testing.assert_frame_equal(whole.reset_index(drop=True), chunked.reset_index(drop=True))
@@ -0,0 +1,164 @@
+"""BatchJobManager: checkpoints, resume and cancellation"""
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import pytest
+from src.jobs import COMPLETED, FAILED, QUEUED, RUNNING, BatchJobManager
+
+CSV = b"url,text\n" + b"".join(f"https://a.example/{i},text {i}\n".encode() for i in range(7))
+
+
+class RecordingPipeline:
+    """Pipeline stand-in whose classify_batch labels each row by its URL and records the calls"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def classify_batch(self, urls, texts, k=55, max_concurrency=8):
+        self.gate.wait(5)
+        self.calls.append(list(urls))
+        return [([f"/label/{url.rsplit('/', 1)[1]}"], None) for url in urls]
+
+
+def wait_for(manager, job_id, statuses=(COMPLETED,), timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = manager.get(job_id)
+        if status is None or status["status"] in statuses:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not reach {statuses}")
+
+
+@pytest.fixture
+def pipeline():
+    return RecordingPipeline()
+
+
+@pytest.fixture
+def make_manager(tmp_path, pipeline):
+    return lambda: BatchJobManager(pipeline, str(tmp_path / "jobs"), chunk_rows=3)
+
+
+def test_job_is_checkpointed_per_chunk(make_manager, pipeline):
+    manager = make_manager()
+    job_id = manager.submit(io.BytesIO(CSV), "pages.csv", k=5)["id"]
+    status = wait_for(manager, job_id)
+
+    assert status["total_rows"] == 7
+    assert status["processed_rows"] == 7 and status["chunks_done"] == 3
+    assert status["progress"] == 1.0
+    assert [len(call) for call in pipeline.calls] == [3, 3, 1]
+    lines = list(manager.iter_results(job_id))
+    assert lines[0].startswith("url,text,categories")
+    assert len(lines) == 8 and "/label/6" in lines[-1]
+
+
+def test_resume_skips_checkpointed_chunks(make_manager, pipeline):
+    manager = make_manager()
+    job_id = manager.submit(io.BytesIO(CSV), "pages.csv")["id"]
+    wait_for(manager, job_id)
+    first_results = list(manager.iter_results(job_id, "ndjson"))
+
+    # Simulate a crash after the first chunk: later checkpoints lost, status still running
+    chunks_dir = manager._path(job_id, manager.CHUNKS_DIR)
+    for name in sorted(os.listdir(chunks_dir))[1:]:
+        os.remove(os.path.join(chunks_dir, name))
+    status_path = manager._path(job_id, manager.STATUS_FILE)
+    with open(status_path) as f:
+        status = json.load(f)
+    status.update(status=RUNNING, processed_rows=3, chunks_done=1)
+    with open(status_path, "w") as f:
+        json.dump(status, f)
+    pipeline.calls.clear()
+
+    restarted = make_manager()
+    assert restarted.resume() == [job_id]
+    status = wait_for(restarted, job_id)
+
+    assert pipeline.calls == [[f"https://a.example/{i}" for i in range(3, 6)], ["https://a.example/6"]]
+    assert status["processed_rows"] == 7 and status["chunks_done"] == 3
+    assert list(restarted.iter_results(job_id, "ndjson")) == first_results
+
+
+def test_resume_ignores_finished_jobs(make_manager):
+    manager = make_manager()
+    job_id = manager.submit(io.BytesIO(CSV), "pages.csv")["id"]
+    wait_for(manager, job_id)
+    assert make_manager().resume() == []
+
+
+def test_job_locked_by_another_worker_is_left_alone(make_manager, pipeline):
+    pipeline.gate.clear()
+    manager = make_manager()
+    job_id = manager.submit(io.BytesIO(CSV), "pages.csv")["id"]
+    wait_for(manager, job_id, statuses=(RUNNING,))
+
+    # A second process resuming the same directory must not process the running job
+    other = make_manager()
+    other.resume()
+    pipeline.gate.set()
+    wait_for(manager, job_id)
+    assert [len(call) for call in pipeline.calls] == [3, 3, 1]
+
+
+def test_cancel_running_job_removes_it(make_manager, pipeline):
+    pipeline.gate.clear()
+    manager = make_manager()
+    job_id = manager.submit(io.BytesIO(CSV), "pages.csv")["id"]
+    wait_for(manager, job_id, statuses=(RUNNING,))
+
+    assert manager.cancel(job_id)
+    pipeline.gate.set()
+    assert wait_for(manager, job_id, statuses=()) is None
+    assert len(pipeline.calls) == 1
+    assert not manager.cancel(job_id)
+
+
+@pytest.mark.parametrize("content, message", [
+    (b"a,b\n1,2\n", "url"),
+    (b"", "empty"),
+])
+def test_invalid_upload_is_rejected(make_manager, content, message):
+    manager = make_manager()
+    with pytest.raises(ValueError, match=message):
+        manager.submit(io.BytesIO(content), "bad.csv")
+    assert os.listdir(manager.directory) == []
+
+
+def test_stats_counts_jobs_by_status(make_manager, pipeline):
+    manager = make_manager()
+    done = manager.submit(io.BytesIO(CSV), "done.csv")["id"]
+    wait_for(manager, done)
+    pipeline.gate.clear()
+    running = manager.submit(io.BytesIO(CSV), "running.csv")["id"]
+    queued = manager.submit(io.BytesIO(CSV), "queued.csv")["id"]
+    wait_for(manager, running, statuses=(RUNNING,))
+
+    assert manager.stats() == {QUEUED: 1, RUNNING: 1, COMPLETED: 1, FAILED: 0}
+    pipeline.gate.set()
+    wait_for(manager, queued)
+    manager.cancel(done)
+    assert manager.stats() == {QUEUED: 0, RUNNING: 0, COMPLETED: 2, FAILED: 0}
+
+
+def test_cancel_of_a_job_removed_meanwhile_returns_false(make_manager, monkeypatch):
+    manager = make_manager()
+    job_id = manager.submit(io.BytesIO(CSV), "pages.csv")["id"]
+    wait_for(manager, job_id)
+
+    # A concurrent cancel removes the directory between the status read and the lock
+    read_status = manager._read_status
+
+    def read_then_remove(job):
+        status = read_status(job)
+        shutil.rmtree(manager._path(job), ignore_errors=True)
+        return status
+
+    monkeypatch.setattr(manager, "_read_status", read_then_remove)
+    assert manager.cancel(job_id) is False
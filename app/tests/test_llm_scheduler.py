@@ -0,0 +1,205 @@
+"""LLMScheduler: priority lanes, retries, timeouts and the circuit breaker"""
+import asyncio
+import threading
+import time
+import pytest
+from src.llm_scheduler import (
+    BATCH,
+    INTERACTIVE,
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMScheduler,
+    LLMTimeoutError,
+    TokenBucket,
+    is_retryable,
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def fast_retries(**kwargs) -> LLMScheduler:
+    options = dict(max_concurrent=2, max_retries=2, backoff_base_seconds=0.01, backoff_max_seconds=0.01)
+    options.update(kwargs)
+    return LLMScheduler(**options)
+
+
+@pytest.mark.parametrize("error, expected", [
+    (StatusError(429), True),
+    (StatusError(503), True),
+    (StatusError(400), False),
+    (RuntimeError("Watsonx returned 502 Bad Gateway"), True),
+    (RuntimeError("invalid prompt"), False),
+    (ConnectionError(), True),
+    (LLMTimeoutError(), True),
+])
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
+
+
+def test_interactive_calls_start_before_queued_batch_calls():
+    scheduler = LLMScheduler(max_concurrent=1)
+    gate = threading.Event()
+    order = []
+    blocker = scheduler.submit(gate.wait, BATCH)
+    time.sleep(0.05)
+
+    batch = [scheduler.submit(lambda i=i: order.append(("batch", i)), BATCH) for i in range(3)]
+    interactive = scheduler.submit(lambda: order.append(("interactive", 0)), INTERACTIVE)
+    gate.set()
+    for future in [blocker, *batch, interactive]:
+        future.result(5)
+
+    assert order[0] == ("interactive", 0)
+    assert order[1:] == [("batch", 0), ("batch", 1), ("batch", 2)]
+
+
+def test_batch_calls_leave_slots_for_interactive_calls():
+    scheduler = LLMScheduler(max_concurrent=4, max_batch_concurrent=2)
+    gate = threading.Event()
+    batch = [scheduler.submit(gate.wait, BATCH) for _ in range(4)]
+    time.sleep(0.05)
+    assert scheduler.stats()["running"][BATCH] == 2
+
+    assert scheduler.submit(lambda: "served", INTERACTIVE).result(5) == "served"
+    gate.set()
+    for future in batch:
+        future.result(5)
+
+
+def test_transient_errors_are_retried():
+    scheduler = fast_retries()
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise StatusError(429)
+        return "ok"
+
+    assert scheduler.submit(flaky).result(5) == "ok"
+    assert len(attempts) == 3
+    assert scheduler.stats()["retries"] == 2
+
+
+def test_retries_are_bounded():
+    scheduler = fast_retries(failure_threshold=100)
+    attempts = []
+
+    def always_fails():
+        attempts.append(1)
+        raise StatusError(503)
+
+    with pytest.raises(StatusError):
+        scheduler.submit(always_fails).result(5)
+    assert len(attempts) == 3
+
+
+def test_client_errors_are_not_retried():
+    scheduler = fast_retries()
+    attempts = []
+
+    def bad_request():
+        attempts.append(1)
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        scheduler.submit(bad_request).result(5)
+    assert len(attempts) == 1
+    assert scheduler.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_timeout_raises_llm_timeout_error():
+    scheduler = fast_retries(max_retries=0, timeout_seconds=0.05)
+    release = threading.Event()
+    with pytest.raises(LLMTimeoutError):
+        scheduler.submit(lambda: release.wait(5)).result(5)
+    assert scheduler.stats()["timeouts"] == 1
+    assert scheduler.stats()["abandoned"] == 1
+    release.set()
+    time.sleep(0.05)
+    assert scheduler.stats()["abandoned"] == 0
+
+
+def test_hanging_calls_hold_back_new_calls():
+    scheduler = LLMScheduler(max_concurrent=1, max_abandoned=1, max_retries=0, timeout_seconds=0.05)
+    release = threading.Event()
+    with pytest.raises(LLMTimeoutError):
+        scheduler.submit(lambda: release.wait(5), BATCH).result(5)
+
+    waiting = scheduler.submit(lambda: "after")
+    time.sleep(0.1)
+    assert not waiting.done()
+    release.set()
+    assert waiting.result(5) == "after"
+
+
+def test_breaker_opens_after_consecutive_failures():
+    scheduler = fast_retries(max_retries=0, failure_threshold=2)
+
+    def unavailable():
+        raise StatusError(503)
+
+    for _ in range(2):
+        with pytest.raises(StatusError):
+            scheduler.submit(unavailable).result(5)
+    assert scheduler.breaker.state == CircuitBreaker.OPEN
+
+
+def test_open_breaker_rejects_interactive_and_holds_batch_calls():
+    scheduler = fast_retries(failure_threshold=1, reset_seconds=0.2)
+    scheduler.breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError) as rejected:
+        scheduler.submit(lambda: "never")
+    assert 0 < rejected.value.retry_after <= 0.2
+    assert scheduler.stats()["rejected"] == 1
+
+    # A batch call backs off until the circuit half-opens, and its success closes it
+    start = time.monotonic()
+    assert scheduler.submit(lambda: "trial", BATCH).result(5) == "trial"
+    assert time.monotonic() - start >= 0.1
+    assert scheduler.breaker.state == CircuitBreaker.CLOSED
+    assert scheduler.submit(lambda: "served").result(5) == "served"
+
+
+def test_rate_limit_spaces_calls():
+    scheduler = LLMScheduler(max_concurrent=4, rate_per_second=50, burst=1)
+    start = time.monotonic()
+    for future in [scheduler.submit(lambda: None) for _ in range(6)]:
+        future.result(5)
+    assert time.monotonic() - start >= 0.09
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, burst=2)
+    bucket.take()
+    bucket.take()
+    assert 0 < bucket.wait_time() <= 0.1
+
+
+def test_cancelled_async_caller_drops_a_queued_call():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrent=1)
+        gate = threading.Event()
+        ran = []
+        blocker = scheduler.submit(gate.wait)
+        waiting = asyncio.ensure_future(scheduler.asubmit(lambda: ran.append(1)))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        # The cancellation reaches the scheduler's future on the next loop iteration
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.wrap_future(blocker)
+        result = await scheduler.asubmit(lambda: "next")
+        return ran, result
+
+    assert asyncio.run(scenario()) == ([], "next")
+
+
+def test_unknown_lane_is_rejected():
+    with pytest.raises(ValueError):
+        LLMScheduler(max_concurrent=1).submit(lambda: None, "bulk")
@@ -0,0 +1,101 @@
+"""Multi-page prompts: answer parsing and single-call fallback"""
+from typing import List
+import pytest
+from src.classifier import TextClassifier
+from src.llm_cache import LLMResultCache
+
+
+class ScriptedModel:
+    """Model returning a fixed answer to multi-page prompts and recording every call"""
+
+    def __init__(self, multi_answer, single_answer: str = "['/Single'"):
+        self.multi_answer = multi_answer
+        self.single_answer = single_answer
+        self.prompts: List[str] = []
+
+    def generate_text(self, prompt: str, guardrails: bool = False, params=None, **kwargs) -> str:
+        self.prompts.append(prompt)
+        if params is not None:
+            if isinstance(self.multi_answer, Exception):
+                raise self.multi_answer
+            return self.multi_answer
+        if isinstance(self.single_answer, Exception):
+            raise self.single_answer
+        return self.single_answer
+
+
+ITEMS = [
+    ("https://a.example/1", "first page", ["/A", "/B"]),
+    ("https://a.example/2", "second page", ["/C"]),
+    ("https://a.example/3", "third page", ["/D"]),
+]
+
+
+def classifier_for(model) -> TextClassifier:
+    return TextClassifier("", "", model=model)
+
+
+@pytest.mark.parametrize("answer, expected", [
+    ("1: ['/A', '/B']\n2: ['/C']", [["/A", "/B"], ["/C"]]),
+    ("ITEM 2) ['/C']\nItem 1. ['/A'", [["/A"], ["/C"]]),
+    ("1: ['/A']\n1: ['/B']\n5: ['/X']", [["/A"], None]),
+    ("1: [{[1]: 2}]\n2: ['/C']", [None, ["/C"]]),
+    ("1: [[[[[[[[[[[[[[[[[[[[[[[[[[[[[[\n2: not a list", [None, None]),
+    ("1: {'/A'}\nno answers here", [None, None]),
+])
+def test_parse_multi_result(answer, expected):
+    assert classifier_for(ScriptedModel(""))._parse_multi_result(answer, 2) == expected
+
+
+def test_parse_multi_result_without_text():
+    assert classifier_for(ScriptedModel(""))._parse_multi_result(None, 2) == [None, None]
+
+
+def test_answered_items_skip_the_fallback():
+    model = ScriptedModel("1: ['/A']\n2: ['/C']\n3: ['/D']")
+    results = classifier_for(model).predict_categories_multi(ITEMS, examples="")
+    assert results == [["/A"], ["/C"], ["/D"]]
+    assert len(model.prompts) == 1
+
+
+def test_unparseable_line_falls_back_to_a_single_call():
+    model = ScriptedModel("1: [{[1]: 2}]\n2: ['/C']\n3: ['/D']")
+    results = classifier_for(model).predict_categories_multi(ITEMS, examples="")
+    assert results == [["/Single"], ["/C"], ["/D"]]
+    assert len(model.prompts) == 2 and "first page" in model.prompts[1]
+
+
+def test_failed_multi_call_is_returned_for_every_item_without_more_calls():
+    error = TimeoutError("LLM call timed out")
+    model = ScriptedModel(error)
+    results = classifier_for(model).predict_categories_multi(ITEMS, examples="")
+    assert results == [error] * 3
+    assert len(model.prompts) == 1
+
+
+def test_parse_failures_alone_fall_back():
+    model = ScriptedModel("not an answer at all")
+    results = classifier_for(model).predict_categories_multi(ITEMS, examples="")
+    assert results == [["/Single"]] * 3
+    assert len(model.prompts) == 4
+
+
+def test_multi_answers_are_not_served_to_single_page_calls():
+    model = ScriptedModel("1: ['/MultiA']\n2: ['/C']\n3: ['/D']")
+    classifier = TextClassifier("", "", model=model, cache=LLMResultCache(max_size=100))
+    assert classifier.predict_categories_multi(ITEMS, examples="")[0] == ["/MultiA"]
+
+    url, text, candidates = ITEMS[0]
+    assert classifier.predict_categories(url, text, candidates, examples="") == ["/Single"]
+    assert len(model.prompts) == 2
+
+    # Both answers are cached: a new multi call uses the single-page one, without a call
+    assert classifier.predict_categories_multi(ITEMS, examples="") == [["/Single"], ["/C"], ["/D"]]
+    assert len(model.prompts) == 2
+
+
+def test_failed_fallback_is_returned_in_place():
+    model = ScriptedModel("2: ['/C']\n3: ['/D']", single_answer=ValueError("400 Bad Request"))
+    results = classifier_for(model).predict_categories_multi(ITEMS, examples="")
+    assert isinstance(results[0], ValueError)
+    assert results[1:] == [["/C"], ["/D"]]
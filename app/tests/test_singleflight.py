@@ -0,0 +1,93 @@
+"""SingleFlight request coalescing"""
+import asyncio
+import pytest
+from src.singleflight import SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_identical_calls_share_one_computation():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return ["/A"]
+
+        results = await asyncio.gather(*[flight.do("key", compute) for _ in range(5)])
+        return flight, calls, results
+
+    flight, calls, results = run(scenario())
+    assert calls == [1]
+    assert results == [["/A"]] * 5
+    assert flight.stats()["coalesced"] == 4
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def compute(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        return await asyncio.gather(flight.do("a", lambda: compute(1)), flight.do("b", lambda: compute(2)))
+
+    assert run(scenario()) == [1, 2]
+
+
+def test_error_reaches_every_waiting_caller():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.05)
+            raise RuntimeError("LLM call failed")
+
+        results = await asyncio.gather(*[flight.do("key", fail) for _ in range(3)], return_exceptions=True)
+        return flight, results
+
+    flight, results = run(scenario())
+    assert len(results) == 3
+    assert all(isinstance(result, RuntimeError) and str(result) == "LLM call failed" for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_failed_key_is_computed_again():
+    async def scenario():
+        flight = SingleFlight()
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("first attempt fails")
+            return "ok"
+
+        with pytest.raises(RuntimeError):
+            await flight.do("key", flaky)
+        return await flight.do("key", flaky)
+
+    assert run(scenario()) == "ok"
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("key", compute))
+        second = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert run(scenario()) == ("done", True)